@@ -0,0 +1,161 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import config
+from app.HeuristicCache import graph_fingerprint
+
+
+def animation_key(graph_vis, **options):
+    """
+    Content address of a demonstration: a hash of the weighted edges, the start and goal nodes, the layout and the
+    render options. Equal graphs get equal keys however they were built.
+
+    :param graph_vis: The GraphVisualization the demonstration is generated for.
+    :param options: Anything else the output depends on, such as the response mode.
+    :return: Hex digest string.
+    """
+    nodes = sorted(graph_vis.G.nodes())
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(graph_fingerprint(graph_vis.G).encode())
+    digest.update(repr((graph_vis.start_node, graph_vis.goal_node, sorted(options.items()))).encode())
+    digest.update(np.array([graph_vis.pos.get(node, (np.nan, np.nan)) for node in nodes], dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+class AnimationCache:
+    """
+    LRU cache of generated demonstrations, stored as their encoded response bodies under animation_key. Entries
+    evicted from memory are spilled to spill_dir, when one is given, and moved back to memory on their next hit.
+
+    >>> cache = AnimationCache(max_bytes=1024)
+    >>> cache.get('key') is None
+    True
+    >>> cache.put('key', b'{"photos": []}')
+    >>> cache.get('key')
+    b'{"photos": []}'
+    >>> cache.hits, cache.misses
+    (1, 1)
+    """
+
+    def __init__(self, max_bytes, spill_dir=None, max_disk_bytes=0):
+        """
+        :param max_bytes: Cap for the entries held in memory.
+        :param spill_dir: Directory for entries evicted from memory, or None to drop them.
+        :param max_disk_bytes: Cap for the spilled entries. The least recently used files are deleted beyond it.
+        """
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def spill_path(self, key):
+        return os.path.join(self.spill_dir, key + '.json')
+
+    def get(self, key):
+        """
+        Return the cached response body, or None on a miss.
+        """
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return data
+
+        data = self._read_spilled(key)
+        with self.lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, data)
+        return data
+
+    def put(self, key, data):
+        """
+        Cache a response body. Bodies larger than max_bytes go straight to the spill directory.
+        """
+        with self.lock:
+            self._store(key, data)
+
+    def _store(self, key, data):
+        evicted = []
+        if key in self.entries:
+            self.size -= len(self.entries.pop(key))
+        if len(data) <= self.max_bytes:
+            self.entries[key] = data
+            self.size += len(data)
+        else:
+            evicted.append((key, data))
+        while self.size > self.max_bytes:
+            old_key, old_data = self.entries.popitem(last=False)
+            self.size -= len(old_data)
+            evicted.append((old_key, old_data))
+        if self.spill_dir:
+            for old_key, old_data in evicted:
+                self._spill(old_key, old_data)
+
+    def _read_spilled(self, key):
+        if not self.spill_dir:
+            return None
+        try:
+            with open(self.spill_path(key), 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+        # Mark the file as recently used for the disk eviction
+        try:
+            os.utime(self.spill_path(key))
+        except OSError:
+            pass
+        return data
+
+    def _spill(self, key, data):
+        if len(data) > self.max_disk_bytes or os.path.exists(self.spill_path(key)):
+            return
+        # Write to a temporary file first, so other processes never read a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.spill_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.spill_path(key))
+
+        files = []
+        for entry in os.scandir(self.spill_dir):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                    'entries': len(self.entries), 'bytes': self.size}
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+animation_cache = AnimationCache(config.Config.ANIMATION_CACHE_MAX_BYTES, config.Config.ANIMATION_CACHE_DIR,
+                                 config.Config.ANIMATION_CACHE_DISK_MAX_BYTES)
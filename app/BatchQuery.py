@@ -0,0 +1,121 @@
+import uuid
+from collections import namedtuple
+
+import networkx as nx
+
+import config
+from app.CsrGraph import csr_cache
+from app.GraphProblem import GraphProblem
+from app.GraphVis import GraphVisualization
+from app.HeuristicCache import graph_fingerprint
+from app.ProcessPool import ProcessPool
+from py_search.base import Node, SolutionNode, TRACE_OFF
+from py_search.informed import near_optimal_front_to_end_bidirectional_search
+
+# The answer to one (start, goal) query. cost and path (the list of nodes from start to goal) are None when the goal
+# is unreachable; expansions counts the nodes expanded by both directions of the search.
+QueryResult = namedtuple('QueryResult', ['start', 'goal', 'cost', 'path', 'expansions'])
+
+
+def graph_from_edges(edges, nodes=()):
+    """
+    Build a GraphVisualization for headless queries. No layout is computed.
+
+    :param edges: (u, v, weight) edges.
+    :param nodes: Extra nodes without edges.
+    """
+    graph_vis = GraphVisualization()
+    graph_vis.edges = [(int(u), int(v), float(weight)) for u, v, weight in edges]
+    graph_vis.G = nx.Graph()
+    graph_vis.G.add_nodes_from(int(node) for node in nodes)
+    graph_vis.G.add_weighted_edges_from(graph_vis.edges)
+    return graph_vis
+
+
+class GraphQueries:
+    """
+    Runs searches between any two nodes of one graph without tracing or rendering. The graph fingerprint is computed
+    once and shared by every query, and the CSR adjacency and the heuristic tables of each endpoint are shared
+    through their caches.
+
+    >>> queries = GraphQueries(graph_from_edges([(0, 1, 1.0), (1, 2, 2.0), (0, 2, 5.0)], nodes=[3]))
+    >>> queries.solve(0, 2)
+    QueryResult(start=0, goal=2, cost=3.0, path=[0, 1, 2], expansions=2)
+    >>> queries.solve(0, 3).cost is None
+    True
+    >>> GraphQueries(graph_from_edges([(0, 1, 0.0), (1, 2, 3.0)])).solve(1, 0)
+    QueryResult(start=1, goal=0, cost=0.0, path=[1, 0], expansions=1)
+    """
+
+    def __init__(self, graph_vis):
+        """
+        :param graph_vis: The GraphVisualization holding the graph.
+        """
+        self.graph_vis = graph_vis
+        self.fingerprint = graph_fingerprint(graph_vis.G)
+        self.csr = csr_cache.get(graph_vis.G, self.fingerprint)
+
+    def solve(self, start, goal):
+        """
+        :raises ValueError: if start or goal is not in the graph.
+        """
+        if start not in self.graph_vis.G or goal not in self.graph_vis.G:
+            raise ValueError(f"Query ({start}, {goal}) has a node that is not present in the graph.")
+        problem = GraphProblem(self.graph_vis, start_node=start, goal_node=goal, csr=self.csr,
+                               fingerprint=self.fingerprint)
+        expansions = 0
+        for node in near_optimal_front_to_end_bidirectional_search(problem, trace=TRACE_OFF):
+            if isinstance(node, SolutionNode):
+                path = [int(start)] + [v for u, v in node.path()]
+                return QueryResult(start, goal, node.cost(), path, expansions)
+            if isinstance(node, Node):
+                expansions += 1
+        return QueryResult(start, goal, None, None, expansions)
+
+
+_worker_queries = (None, None)
+# Pool of the processes solving batch queries, sized separately from the rendering pool
+batch_pool = ProcessPool()
+
+
+def _solve_chunk(token, data, pairs):
+    """
+    Solve a run of queries in a worker. The graph and its shared structures are kept between the chunks of one batch.
+    """
+    global _worker_queries
+    if _worker_queries[0] != token:
+        _worker_queries = (token, GraphQueries(GraphVisualization.from_bytes(data)))
+    queries = _worker_queries[1]
+    return [queries.solve(start, goal) for start, goal in pairs]
+
+
+def batch_query(graph_vis, pairs, processes=None):
+    """
+    Solve many (start, goal) queries on one graph, spread over the batch process pool when more than one process is
+    configured. Each worker receives the graph once, in its compact binary form, and builds the shared structures
+    once for all of its queries.
+
+    :param graph_vis: The GraphVisualization holding the graph.
+    :param pairs: List of (start, goal) node pairs.
+    :param processes: Number of worker processes (defaults to Config.BATCH_PROCESSES).
+    :return: List of QueryResult, in the order of pairs.
+    :raises ValueError: if a query has a node that is not in the graph.
+    """
+    pairs = [(int(start), int(goal)) for start, goal in pairs]
+    for start, goal in pairs:
+        if start not in graph_vis.G or goal not in graph_vis.G:
+            raise ValueError(f"Query ({start}, {goal}) has a node that is not present in the graph.")
+    if processes is None:
+        processes = config.Config.BATCH_PROCESSES
+    processes = min(processes, len(pairs))
+
+    if processes <= 1:
+        queries = GraphQueries(graph_vis)
+        return [queries.solve(start, goal) for start, goal in pairs]
+
+    data = graph_vis.to_bytes()
+    token = uuid.uuid4().hex
+    bounds = [len(pairs) * i // processes for i in range(processes + 1)]
+    chunks = [(token, data, pairs[start:end]) for start, end in zip(bounds, bounds[1:])]
+    return [result for results in batch_pool.run(processes, _solve_chunk, chunks)
+            for result in results]
@@ -0,0 +1,209 @@
+import sys
+
+import numpy as np
+
+import config
+from app.HeuristicCache import FingerprintCache, graph_fingerprint
+
+
+class CsrGraph:
+    """
+    A compressed sparse row (CSR) representation of a weighted graph.
+
+    The neighbors of the node with index ``i`` are
+    ``indices[indptr[i]:indptr[i + 1]]`` and the matching edge weights are
+    ``weights[indptr[i]:indptr[i + 1]]``. ``labels`` maps an index back to the
+    original node label. When the labels are exactly ``0..n-1`` the label is
+    its own index and no mapping is needed at all.
+
+    >>> import networkx as nx
+    >>> G = nx.Graph()
+    >>> G.add_edge(0, 1, weight=2.0)
+    >>> G.add_edge(1, 2, weight=5.0)
+    >>> csr = CsrGraph.from_networkx(G)
+    >>> csr.neighbors(1)
+    ([0, 2], [2.0, 5.0])
+    >>> 3 in csr
+    False
+    """
+
+    def __init__(self, labels, indptr, indices, weights):
+        self.labels = labels
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.contiguous = bool(np.array_equal(labels, np.arange(len(labels))))
+        self.label_index = None if self.contiguous else {int(label): idx for idx, label in enumerate(labels.tolist())}
+
+    @classmethod
+    def from_edges(cls, labels, sources, targets, weights, directed=False):
+        """
+        Build the CSR arrays from parallel edge arrays given by node label.
+
+        :param labels: Every node label in the graph.
+        :param sources: The source label of each edge.
+        :param targets: The target label of each edge.
+        :param weights: The weight of each edge.
+        :param directed: If False every edge is stored in both directions.
+        """
+        labels = np.unique(np.asarray(labels, dtype=np.int64))
+        src = np.searchsorted(labels, np.asarray(sources, dtype=np.int64))
+        dst = np.searchsorted(labels, np.asarray(targets, dtype=np.int64))
+        weights = np.asarray(weights, dtype=np.float64)
+        if not directed:
+            src, dst = np.concatenate([src, dst]), np.concatenate([dst, src])
+            weights = np.concatenate([weights, weights])
+
+        order = np.argsort(src, kind='stable')
+        index_dtype = np.int32 if len(labels) < 2 ** 31 else np.int64
+        indptr = np.zeros(len(labels) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=len(labels)), out=indptr[1:])
+        return cls(labels, indptr, dst[order].astype(index_dtype), weights[order])
+
+    @classmethod
+    def from_networkx(cls, G, weight='weight'):
+        """
+        Build the CSR arrays once from a networkx graph with integer nodes. Nodes and neighbors keep the
+        networkx iteration order, so searches expand them in the same order as on the networkx graph.
+
+        :param G: The networkx graph.
+        :param weight: The edge attribute holding the weight (missing weights count as 1).
+        """
+        labels = np.fromiter(G.nodes(), dtype=np.int64, count=G.number_of_nodes())
+        index = {label: idx for idx, label in enumerate(labels.tolist())}
+        indptr = np.zeros(len(labels) + 1, dtype=np.int64)
+        indices = []
+        weights = []
+        for idx, label in enumerate(labels.tolist()):
+            for neighbor, data in G.adj[label].items():
+                indices.append(index[neighbor])
+                weights.append(data.get(weight, 1.0))
+            indptr[idx + 1] = len(indices)
+        index_dtype = np.int32 if len(labels) < 2 ** 31 else np.int64
+        return cls(labels, indptr, np.array(indices, dtype=index_dtype), np.array(weights, dtype=np.float64))
+
+    def reverse(self):
+        """
+        Returns the CSR graph with every edge reversed, used to expand
+        predecessors in directed graphs.
+        """
+        counts = np.diff(self.indptr)
+        src = np.repeat(np.arange(len(self.labels)), counts)
+        return CsrGraph.from_edges(self.labels, self.labels[self.indices], self.labels[src], self.weights,
+                                   directed=True)
+
+    def index_of(self, label):
+        """
+        Returns the integer index of a node label.
+
+        :raises KeyError: if the label is not in the graph.
+        """
+        if self.contiguous:
+            if 0 <= label < len(self.labels):
+                return label
+            raise KeyError(label)
+        return self.label_index[label]
+
+    def neighbors(self, label):
+        """
+        Returns the neighbor labels of a node and the weights of the edges to
+        them as two lists.
+
+        :param label: The node label.
+        """
+        idx = self.index_of(label)
+        start, end = self.indptr[idx:idx + 2].tolist()
+        if self.contiguous:
+            neighbors = self.indices[start:end].tolist()
+        else:
+            neighbors = self.labels[self.indices[start:end]].tolist()
+        return neighbors, self.weights[start:end].tolist()
+
+    def shortest_path_lengths(self, label):
+        """
+        Returns the weighted shortest path length from a node to every node, as an array indexed by node index
+        (``inf`` for unreachable nodes). The relaxation is label-correcting and vectorized over the whole frontier
+        at once, so it needs one NumPy round per hop of the longest shortest path rather than Python work per edge.
+        Weights must be non-negative.
+
+        :param label: The source node label.
+        """
+        dist = np.full(len(self.labels), np.inf)
+        dist[self.index_of(label)] = 0.0
+        frontier = np.array([self.index_of(label)])
+        degrees = np.diff(self.indptr)
+        while frontier.size:
+            lengths = degrees[frontier]
+            # Positions of every edge leaving the frontier in the indices/weights arrays
+            offsets = np.repeat(self.indptr[frontier] - (np.cumsum(lengths) - lengths), lengths)
+            offsets += np.arange(offsets.size)
+            targets = self.indices[offsets]
+            candidates = np.repeat(dist[frontier], lengths) + self.weights[offsets]
+            improved = candidates < dist[targets]
+            targets = targets[improved]
+            np.minimum.at(dist, targets, candidates[improved])
+            frontier = np.unique(targets)
+        return dist
+
+    @property
+    def nbytes(self):
+        size = self.labels.nbytes + self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes
+        if self.label_index is not None:
+            # The dict itself plus one int key and one int value per node
+            size += sys.getsizeof(self.label_index) + len(self.label_index) * 2 * sys.getsizeof(2 ** 40)
+        return size
+
+    def __contains__(self, label):
+        try:
+            self.index_of(label)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __len__(self):
+        return len(self.labels)
+
+
+class CsrCache(FingerprintCache):
+    """
+    LRU cache of the (forward, backward) CsrGraphs of each graph, keyed by graph fingerprint, so that the arrays are
+    built once per graph rather than once per search. Graphs with the same fingerprint share the arrays built from
+    the first of them, neighbors included in its iteration order.
+
+    >>> import networkx as nx
+    >>> cache = CsrCache(max_bytes=1024 * 1024)
+    >>> csr_f, csr_b = cache.get(nx.path_graph(3))
+    >>> csr_b is csr_f, cache.get(nx.path_graph(3))[0] is csr_f
+    (True, True)
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: Approximate memory cap for all cached arrays.
+        """
+        super().__init__(max_bytes, self.csr_size)
+
+    @staticmethod
+    def csr_size(csr):
+        csr_f, csr_b = csr
+        return csr_f.nbytes if csr_b is csr_f else csr_f.nbytes + csr_b.nbytes
+
+    def get(self, G, fingerprint=None):
+        """
+        Return the forward CsrGraph of G and the one with every edge reversed (the same object for undirected
+        graphs), building them on a miss.
+
+        :param G: The networkx graph.
+        :param fingerprint: The graph fingerprint, if the caller has already computed it.
+        """
+        if fingerprint is None:
+            fingerprint = graph_fingerprint(G)
+
+        def compute():
+            csr_f = CsrGraph.from_networkx(G)
+            return csr_f, csr_f.reverse() if G.is_directed() else csr_f
+
+        return self.fetch(fingerprint, compute)
+
+
+csr_cache = CsrCache(config.Config.CSR_CACHE_MAX_BYTES)
@@ -0,0 +1,111 @@
+import networkx as nx
+
+
+class FrontierTree:
+    """
+    The search tree expanded so far by one direction of the search. Each state's parent is recorded once, when the
+    state joins the tree, and the edges are kept in an incrementally maintained set, so the tree grows by O(1) per
+    step, an edge query is a set lookup and the path to any state is a single walk up the parent records. This gives
+    the same tree as GraphVisualization.filter_graph over all added nodes, since every node on the path of an added
+    node was itself added earlier, without re-walking every path for every frame.
+
+    >>> from py_search.base import Node
+    >>> root = Node(0)
+    >>> child = Node(1, root, (0, 1), 4.0)
+    >>> tree = FrontierTree()
+    >>> tree.add(root)
+    >>> tree.add(child)
+    >>> tree.add(Node(2, child, (1, 2), 5.0))
+    >>> tree.edges
+    [(0, 1), (1, 2)]
+    >>> tree.has_edge(1, 0), tree.has_edge(0, 2)
+    (True, False)
+    >>> tree.path(2)
+    ((0, 1), (1, 2))
+    >>> tree.graph[0][1]['weight']
+    4.0
+    >>> tree.snapshot()
+    (3, 2)
+    """
+
+    def __init__(self):
+        # State -> the state it was first reached from, or None for the root (and states whose parent was not in the
+        # tree)
+        self.parents = {}
+        # States and edges in the order they joined the tree, so that any earlier tree is a prefix of both
+        self.node_order = []
+        self.edge_order = []
+        self.edge_weights = []
+        self.edge_set = set()
+
+    def add(self, node):
+        """
+        Add a node and the edge to its parent, if the parent's state is already in the tree. The edge weight is the
+        cost difference between the node and its parent.
+
+        :param node: The expanded Node or GoalNode.
+        """
+        state = node.state
+        parent = node.parent
+        if parent is not None and parent.state not in self.parents:
+            parent = None
+        if state not in self.parents:
+            self.parents[state] = None if parent is None else parent.state
+            self.node_order.append(state)
+        if parent is not None and not self.has_edge(parent.state, state):
+            edge = (parent.state, state)
+            self.edge_order.append(edge)
+            self.edge_weights.append(node.cost() - parent.cost())
+            self.edge_set.add(edge)
+
+    def has_edge(self, u, v):
+        """
+        Return whether the tree has an edge between u and v, in either direction.
+        """
+        return (u, v) in self.edge_set or (v, u) in self.edge_set
+
+    def path(self, state):
+        """
+        Return the (parent, child) edges from the root of the tree down to state. For the backward tree the root is
+        the goal, so the edges are reversed with respect to the search problem.
+
+        :raises KeyError: if state is not in the tree.
+        """
+        edges = []
+        parent = self.parents[state]
+        while parent is not None:
+            edges.append((parent, state))
+            state, parent = parent, self.parents[parent]
+        edges.reverse()
+        return tuple(edges)
+
+    def snapshot(self):
+        """
+        Return the size of the tree as (number of nodes, number of edges). Since the tree only grows, this is enough
+        to recover the tree at this point from node_order and edge_order later on.
+        """
+        return len(self.node_order), len(self.edge_order)
+
+    @property
+    def graph(self):
+        """
+        The tree as a new networkx graph with weighted edges.
+        """
+        graph = nx.Graph()
+        graph.add_nodes_from(self.node_order)
+        graph.add_weighted_edges_from((u, v, weight) for (u, v), weight in zip(self.edge_order, self.edge_weights))
+        return graph
+
+    @property
+    def nodes(self):
+        return self.node_order
+
+    @property
+    def edges(self):
+        return self.edge_order
+
+    def __contains__(self, state):
+        return state in self.parents
+
+    def __len__(self):
+        return len(self.node_order)
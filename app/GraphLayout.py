@@ -0,0 +1,219 @@
+import networkx as nx
+import numpy as np
+
+import config
+from app.CsrGraph import CsrGraph
+from app.HeuristicCache import FingerprintCache, graph_fingerprint
+
+# Cell offsets of the 3x3 neighborhood of a cell, and of the 6x6 children of the 3x3 neighborhood of its parent
+NEIGHBORHOOD = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+PARENT_NEIGHBORHOOD = np.array([(dx, dy) for dx in range(6) for dy in range(6)])
+
+
+def force_directed_layout(G, pos=None, fixed=None, iterations=50, seed=None):
+    """
+    Fruchterman-Reingold layout that scales to thousands of nodes, with the same forces and cooling schedule as
+    nx.spring_layout.
+
+    The repulsion between all pairs of nodes is approximated with a Barnes-Hut style quadtree, laid out as a pyramid
+    of grids: level l splits the bounding box into 2^l by 2^l cells, down to a finest level of about one node per cell.
+    At every level each cell is repelled by the centroid (weighted by the number of nodes in it) of the cells that
+    are well separated from it but were not already at the level above: the children of the 3x3 cells around its
+    parent cell, minus the 3x3 cells around itself, at most 27 cells. At the finest level the nodes of the 3x3 cells
+    around a node's cell repel it exactly. This is O(n log n) work per iteration, vectorized per level, instead of
+    the O(n^2) of the exact layout. The attraction along the edges is exact.
+
+    >>> G = nx.path_graph(600)
+    >>> pos = force_directed_layout(G, seed=0)
+    >>> len(pos), bool(np.abs(np.array(list(pos.values()))).max() <= 1.0)
+    (600, True)
+
+    :param G: The networkx graph, with integer nodes.
+    :param pos: Initial positions of some nodes; the others start at random.
+    :param fixed: Nodes that keep their initial position. When there are none the layout is rescaled to [-1, 1].
+    :param iterations: Number of iterations.
+    :param seed: Seed of the random initial positions.
+    :return: Dict from node to its position as a numpy array.
+    """
+    nodes = list(G)
+    n = len(nodes)
+    if n == 0:
+        return {}
+    index = {node: idx for idx, node in enumerate(nodes)}
+    xy = np.random.default_rng(seed).random((n, 2))
+    for node, xy_node in (pos or {}).items():
+        if node in index:
+            xy[index[node]] = xy_node
+    movable = np.ones(n, dtype=bool)
+    for node in fixed or ():
+        movable[index[node]] = False
+
+    csr = CsrGraph.from_networkx(G)
+    sources = np.repeat(np.arange(n), np.diff(csr.indptr))
+    targets = csr.indices
+    k = np.sqrt(1.0 / n)
+    depth = max(int(np.log2(n) / 2) + 1, 2)
+    cells = 2 ** depth
+    temperature = max(np.ptp(xy[:, 0]), np.ptp(xy[:, 1])) * 0.1
+    cooling = temperature / (iterations + 1)
+    # Coordinates and forces are kept as separate x and y arrays, which numpy handles much faster than (n, 2) arrays
+    x, y = xy[:, 0].copy(), xy[:, 1].copy()
+
+    for _ in range(iterations):
+        # The grid covers the bulk of the nodes; the few that drift far away (e.g. isolated nodes) join the border
+        # cells instead of stretching the grid so that everything else falls into a few cells
+        low_x, high_x = np.percentile(x, [1, 99])
+        low_y, high_y = np.percentile(y, [1, 99])
+        span = max(high_x - low_x, high_y - low_y, 1e-9)
+        cell_x = np.clip(((x - low_x) / span * cells).astype(np.int64), 0, cells - 1)
+        cell_y = np.clip(((y - low_y) / span * cells).astype(np.int64), 0, cells - 1)
+        force_x = np.zeros(n)
+        force_y = np.zeros(n)
+
+        # Far field, one batch of cell to cell interactions per level. All nodes of a cell share the force on its
+        # centroid, which is accurate enough since interacting cells are always at least one cell apart.
+        for level in range(2, depth + 1):
+            side = 2 ** level
+            level_cell = (cell_x >> (depth - level)) * side + (cell_y >> (depth - level))
+            mass = np.bincount(level_cell, minlength=side * side).astype(float)
+            centroid_x = np.bincount(level_cell, x, side * side) / np.maximum(mass, 1.0)
+            centroid_y = np.bincount(level_cell, y, side * side) / np.maximum(mass, 1.0)
+            occupied = np.flatnonzero(mass)
+            occupied_x, occupied_y = occupied // side, occupied % side
+            other_x = ((occupied_x >> 1) * 2 - 2)[:, None] + PARENT_NEIGHBORHOOD[None, :, 0]
+            other_y = ((occupied_y >> 1) * 2 - 2)[:, None] + PARENT_NEIGHBORHOOD[None, :, 1]
+            far = ((other_x >= 0) & (other_x < side) & (other_y >= 0) & (other_y < side)
+                   & ((np.abs(other_x - occupied_x[:, None]) > 1) | (np.abs(other_y - occupied_y[:, None]) > 1)))
+            cells_a = occupied[np.nonzero(far)[0]]
+            cells_b = other_x[far] * side + other_y[far]
+            nonempty = mass[cells_b] > 0
+            cells_a, cells_b = cells_a[nonempty], cells_b[nonempty]
+            delta_x = centroid_x[cells_a] - centroid_x[cells_b]
+            delta_y = centroid_y[cells_a] - centroid_y[cells_b]
+            force = mass[cells_b] * k * k / np.maximum(delta_x * delta_x + delta_y * delta_y, 1e-6)
+            force_x += np.bincount(cells_a, delta_x * force, side * side)[level_cell]
+            force_y += np.bincount(cells_a, delta_y * force, side * side)[level_cell]
+
+        # Near field: every pair of nodes in neighboring cells of the finest level
+        cell = cell_x * cells + cell_y
+        counts = np.bincount(cell, minlength=cells * cells)
+        order = np.argsort(cell, kind='stable')
+        first = np.searchsorted(cell[order], np.arange(cells * cells))
+        other_x = cell_x[:, None] + NEIGHBORHOOD[None, :, 0]
+        other_y = cell_y[:, None] + NEIGHBORHOOD[None, :, 1]
+        inside = (other_x >= 0) & (other_x < cells) & (other_y >= 0) & (other_y < cells)
+        ids = np.nonzero(inside)[0]
+        other = other_x[inside] * cells + other_y[inside]
+        same = counts[other]
+        pair_i = np.repeat(ids, same)
+        pair_j = order[np.repeat(first[other] - (np.cumsum(same) - same), same) + np.arange(pair_i.size)]
+        distinct = pair_i != pair_j
+        pair_i, pair_j = pair_i[distinct], pair_j[distinct]
+        delta_x, delta_y = x[pair_i] - x[pair_j], y[pair_i] - y[pair_j]
+        force = k * k / np.maximum(delta_x * delta_x + delta_y * delta_y, 1e-6)
+        force_x += np.bincount(pair_i, delta_x * force, n)
+        force_y += np.bincount(pair_i, delta_y * force, n)
+
+        # Attraction along the edges
+        delta_x, delta_y = x[sources] - x[targets], y[sources] - y[targets]
+        force = csr.weights * np.sqrt(delta_x * delta_x + delta_y * delta_y) / k
+        force_x -= np.bincount(sources, delta_x * force, n)
+        force_y -= np.bincount(sources, delta_y * force, n)
+
+        length = np.sqrt(force_x * force_x + force_y * force_y)
+        step = temperature / np.where(length < 0.01, 0.1, length)
+        x[movable] += (force_x * step)[movable]
+        y[movable] += (force_y * step)[movable]
+        temperature -= cooling
+
+    xy = np.stack([x, y], axis=1)
+    if not fixed:
+        xy = nx.rescale_layout(xy)
+    return dict(zip(nodes, xy))
+
+
+def compute_layout(G, seed=None):
+    """
+    Lay out a whole graph: with nx.spring_layout up to Config.LAYOUT_APPROXIMATE_MIN_NODES nodes, and with the
+    approximate force_directed_layout above that.
+    """
+    if G.number_of_nodes() < config.Config.LAYOUT_APPROXIMATE_MIN_NODES:
+        return nx.spring_layout(G, seed=seed)
+    return force_directed_layout(G, seed=seed)
+
+
+def place_new_nodes(G, pos, seed=None):
+    """
+    Complete the layout of a graph whose nodes are partly laid out already, e.g. after its edges were edited. The
+    laid out nodes stay where they are; every new node starts at the mean position of its laid out neighbors (or at
+    random) and only the new nodes are moved by the layout iterations.
+
+    :param G: The networkx graph.
+    :param pos: The existing positions; positions of nodes no longer in G are dropped.
+    :return: Dict from node to position for every node of G.
+    """
+    pos = {node: xy for node, xy in pos.items() if node in G}
+    new_nodes = [node for node in G if node not in pos]
+    if not new_nodes:
+        return pos
+    if not pos:
+        return layout_cache.get(G, seed=seed)
+
+    rng = np.random.default_rng(seed)
+    known = np.array(list(pos.values()), dtype=float)
+    low, high = known.min(axis=0), known.max(axis=0)
+    jitter = max((high - low).max(), 1e-3) * 0.05
+    initial = dict(pos)
+    for node in new_nodes:
+        neighbors = [pos[neighbor] for neighbor in G.neighbors(node) if neighbor in pos]
+        if neighbors:
+            initial[node] = np.mean(neighbors, axis=0) + rng.normal(0.0, jitter, 2)
+        else:
+            initial[node] = rng.uniform(low, high)
+
+    if G.number_of_nodes() < config.Config.LAYOUT_APPROXIMATE_MIN_NODES:
+        return nx.spring_layout(G, pos=initial, fixed=list(pos), seed=seed)
+    return force_directed_layout(G, pos=initial, fixed=list(pos), seed=seed)
+
+
+class LayoutCache(FingerprintCache):
+    """
+    LRU cache of whole graph layouts keyed by graph fingerprint, so that a graph that was laid out before (a reload,
+    the same graph posted again) gets the same positions without running the layout again.
+
+    >>> cache = LayoutCache(max_bytes=1024 * 1024)
+    >>> first = cache.get(nx.path_graph(3))
+    >>> second = cache.get(nx.path_graph(3))
+    >>> all((first[node] == second[node]).all() for node in first)
+    True
+    >>> cache.hits, cache.misses
+    (1, 1)
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: Approximate memory cap for all cached layouts.
+        """
+        super().__init__(max_bytes, self.layout_size)
+
+    @staticmethod
+    def layout_size(layout):
+        nodes, xy = layout
+        return nodes.nbytes + xy.nbytes
+
+    def get(self, G, fingerprint=None, seed=None):
+        """
+        Return the layout of G as a new dict from node to position, computing and caching it on a miss.
+        """
+        if fingerprint is None:
+            fingerprint = graph_fingerprint(G)
+
+        def compute():
+            pos = compute_layout(G, seed=seed)
+            return np.array(list(pos), dtype=np.int64), np.array(list(pos.values()), dtype=float).reshape(-1, 2)
+
+        nodes, xy = self.fetch(fingerprint, compute)
+        return dict(zip(nodes.tolist(), xy.copy()))
+
+
+layout_cache = LayoutCache(config.Config.LAYOUT_CACHE_MAX_BYTES)
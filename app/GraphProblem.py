@@ -1,17 +1,66 @@
-import networkx as nx
+import config
+from app.CsrGraph import csr_cache
+from app.HeuristicCache import graph_fingerprint, heuristic_cache
+# Re-exported: rank_dict_by_values was defined in this module before it moved to HeuristicCache
+from app.HeuristicCache import rank_dict_by_values  # noqa: F401
+from app.LandmarkHeuristic import landmark_cache
 from py_search.base import Problem, GoalNode, Node
 
 
 class GraphProblem(Problem):
-    def __init__(self, graph_vis):
-        super().__init__(int(graph_vis.start_node), int(graph_vis.goal_node))  # Ensure nodes are integers
+    def __init__(self, graph_vis, use_csr=True, start_node=None, goal_node=None, csr=None, fingerprint=None,
+                 heuristic=None):
+        """
+        :param graph_vis: The GraphVisualization holding the graph and the start and goal nodes.
+        :param use_csr: Expand nodes through a CsrGraph built once per graph (and cached by graph fingerprint),
+            instead of querying the networkx graph on every expansion.
+        :param start_node: Overrides graph_vis.start_node, for running several queries on one graph.
+        :param goal_node: Overrides graph_vis.goal_node.
+        :param csr: The (forward, backward) CsrGraphs of the graph, if they were already built for another query.
+        :param fingerprint: The graph fingerprint, if it was already computed for another query.
+        :param heuristic: 'rank', 'landmarks' or 'auto' (defaults to Config.HEURISTIC). The rank heuristic runs a
+            Dijkstra search from each endpoint not queried before; the landmark heuristic needs none once the
+            landmarks of the graph are computed.
+        """
+        start_node = graph_vis.start_node if start_node is None else start_node
+        goal_node = graph_vis.goal_node if goal_node is None else goal_node
+        super().__init__(int(start_node), int(goal_node))  # Ensure nodes are integers
         self.G = graph_vis.G
-        single_src_dijkstra_forward = nx.single_source_dijkstra_path_length(self.G, int(graph_vis.goal_node), weight='weight')
-        self.H_f = rank_dict_by_values(single_src_dijkstra_forward)
-        single_src_dijkstra_backward = nx.single_source_dijkstra_path_length(self.G, int(graph_vis.start_node), weight='weight')
-        self.H_b = rank_dict_by_values(single_src_dijkstra_backward)
+        # The CSR arrays and the heuristic tables are shared with every other query on the same graph
+        if fingerprint is None:
+            fingerprint = graph_fingerprint(self.G)
+        self.csr_f = self.csr_b = None
+        if csr is not None:
+            self.csr_f, self.csr_b = csr
+        elif use_csr:
+            self.csr_f, self.csr_b = csr_cache.get(self.G, fingerprint)
+        heuristic = heuristic or config.Config.HEURISTIC
+        if heuristic == 'auto':
+            heuristic = 'landmarks' if self.G.number_of_nodes() >= config.Config.LANDMARK_MIN_NODES else 'rank'
+        self.heuristic = heuristic
+        self.H_f = self.H_b = None
+        if heuristic == 'rank':
+            self.H_f = heuristic_cache.get(self.G, goal_node, fingerprint)
+            self.H_b = heuristic_cache.get(self.G, start_node, fingerprint)
+        elif heuristic == 'landmarks':
+            landmarks = landmark_cache.get(self.G, fingerprint, (self.csr_f, self.csr_b) if self.csr_f else None)
+            self.estimate_f = landmarks.heuristic(goal_node, forward=True)
+            self.estimate_b = landmarks.heuristic(start_node, forward=False)
+        else:
+            raise ValueError(f"Unknown heuristic: {heuristic}")
+
+    def state_space_size(self):
+        """
+        Graphs whose nodes are labelled 0..n-1 (e.g. the generated ones) have dense states when they are searched
+        through a CsrGraph, so their searches keep the closed lists in arrays.
+        """
+        if self.csr_f is not None and self.csr_f.contiguous:
+            return len(self.csr_f)
+        return None
 
     def shortest_path_heuristic(self, node, forward):
+        if self.H_f is None:
+            return self.estimate_f(node) if forward else self.estimate_b(node)
         if forward:
             return self.H_f.get(node, float("inf"))
         else:
@@ -30,14 +79,22 @@ class GraphProblem(Problem):
         Computes successors of the given node in the graph.
 
         Yields Node objects representing each successor along with necessary
-        information such as action taken, path cost, etc.
+        information such as action taken (the ``(u, v)`` edge), path cost, etc.
 
         :param node: Node identifier in the graph.
         :return: Generator yielding successors as Node objects.
         """
-        if node.state in self.G.nodes():
+        if self.csr_f is not None:
+            try:
+                neighbors, weights = self.csr_f.neighbors(node.state)
+            except KeyError:
+                raise ValueError(f"Node {node} is not present in the graph.")
+            cost = node.cost()
+            for neighbor, path_cost in zip(neighbors, weights):
+                yield Node(neighbor, node, (node.state, neighbor), cost + path_cost)
+        elif node.state in self.G:
             for neighbor in self.G.neighbors(node.state):
-                action = f"{node} -> {neighbor}"
+                action = (node.state, int(neighbor))
                 path_cost = self.G[node.state][neighbor]["weight"]
                 successor_node = Node(int(neighbor), node, action, node.cost() + path_cost)  # Ensure neighbor is integer
                 yield successor_node
@@ -49,35 +106,24 @@ class GraphProblem(Problem):
         Computes predecessors of the given node in the graph.
 
         Yields Node objects representing each predecessor along with necessary
-        information such as action taken, path cost, etc.
+        information such as action taken (the ``(u, v)`` edge), path cost, etc.
         :param goal_node: identifier in the graph.
         :return: Generator yielding predecessors as Node objects.
        """
-        if goal_node.state in self.G.nodes():
+        if self.csr_b is not None:
+            try:
+                neighbors, weights = self.csr_b.neighbors(goal_node.state)
+            except KeyError:
+                raise ValueError(f"Node {goal_node} is not present in the graph.")
+            cost = goal_node.cost()
+            for neighbor, path_cost in zip(neighbors, weights):
+                yield GoalNode(neighbor, goal_node, (neighbor, goal_node.state), cost + path_cost)
+        elif goal_node.state in self.G:
             for neighbor in self.G.neighbors(goal_node.state):
-                action = f"{neighbor} -> {goal_node}"
+                action = (int(neighbor), goal_node.state)
                 path_cost = self.G[goal_node.state][neighbor]["weight"]
                 successor_node = GoalNode(int(neighbor), goal_node, action, goal_node.cost() + path_cost)  # Ensure neighbor is integer
                 yield successor_node
         else:
             raise ValueError(f"Node {goal_node} is not present in the graph.")
 
-
-def rank_dict_by_values(input_dict):
-    # Sort the dictionary by its values
-    sorted_items = sorted(input_dict.items(), key=lambda item: item[1])
-
-    # Initialize variables
-    rank = 0
-    last_value = None
-    rank_dict = {}
-
-    # Assign ranks
-    for idx, (key, value) in enumerate(sorted_items):
-        rank_dict[key] = rank
-        if value != last_value:
-            rank += 1
-        last_value = value
-
-    return rank_dict
-
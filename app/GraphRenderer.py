@@ -0,0 +1,406 @@
+import base64
+import io
+import math
+import uuid
+from collections import namedtuple
+
+import numpy as np
+from matplotlib import image as mpimg
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+
+import config
+from app.ProcessPool import ProcessPool
+
+TRANSPARENT = (0.0, 0.0, 0.0, 0.0)
+
+# A lightweight description of one frame. The search trees only grow, so a frame is fully described by how many of
+# the nodes and edges of each tree (in the order they joined it) it shows, plus the solution path in the final frame.
+Frame = namedtuple('Frame', ['front_nodes', 'front_edges', 'back_nodes', 'back_edges', 'path_edges'])
+
+
+class GraphRenderer:
+    """
+    Renders the search frames of one graph on a persistent figure.
+
+    Everything that is the same in every frame is set up once: the figure, the axes limits, the node positions, the
+    segment of every edge and a rasterized background with the whole graph drawn faintly. The nodes, edges and labels
+    of the search trees are a fixed set of animated artists. A frame only updates the colors, sizes and visibility of
+    the nodes and edges that changed since the previous frame, restores the cached background and draws the animated
+    artists on top of it, instead of building a new figure through nx.draw.
+
+    Produces the same kind of frames as GraphVisualization.generate_combined_graph_image: the forward tree in green,
+    the backward tree in red and, once the path is known, the path edges in light green.
+    """
+
+    def __init__(self, graph_vis, figsize=(6, 6), dpi=100):
+        """
+        :param graph_vis: The GraphVisualization holding the graph and its layout.
+        :param figsize: Figure size in inches.
+        :param dpi: Resolution of the rendered frames.
+        """
+        G = graph_vis.G
+        self.nodes = list(G.nodes())
+        self.node_index = {node: idx for idx, node in enumerate(self.nodes)}
+        self.xy = np.array([graph_vis.pos[node] for node in self.nodes], dtype=float).reshape(-1, 2)
+        self.edges = [(u, v) for u, v in G.edges()]
+        self.edge_index = {}
+        for idx, (u, v) in enumerate(self.edges):
+            self.edge_index[(u, v)] = self.edge_index[(v, u)] = idx
+        self.weights = [d.get('weight', 1.0) for u, v, d in G.edges(data=True)]
+        segments = np.array([[graph_vis.pos[u], graph_vis.pos[v]] for u, v in self.edges], dtype=float)
+        segments = segments.reshape(-1, 2, 2)
+
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_axes((0.02, 0.12, 0.96, 0.86))
+        self.ax.set_axis_off()
+        if len(self.xy):
+            (x_min, y_min), (x_max, y_max) = self.xy.min(axis=0), self.xy.max(axis=0)
+            x_pad = max((x_max - x_min) * 0.1, 0.1)
+            y_pad = max((y_max - y_min) * 0.1, 0.1)
+            self.ax.set_xlim(x_min - x_pad, x_max + x_pad)
+            self.ax.set_ylim(y_min - y_pad, y_max + y_pad)
+
+        # Static, rasterized background: the whole graph, faintly
+        self.ax.add_collection(LineCollection(segments, colors='#eeeeee', linewidths=1.0, zorder=0, rasterized=True))
+        self.ax.scatter(self.xy[:, 0], self.xy[:, 1], s=60, c='#eeeeee', zorder=0, rasterized=True)
+
+        # Animated artists, hidden until a frame makes them visible
+        self.edge_colors = np.zeros((len(self.edges), 4))
+        self.edge_widths = np.ones(len(self.edges))
+        self.edge_artist = LineCollection(segments, colors=self.edge_colors, zorder=1, animated=True)
+        self.ax.add_collection(self.edge_artist)
+        self.front_colors = np.zeros((len(self.nodes), 4))
+        self.back_colors = np.zeros((len(self.nodes), 4))
+        self.front_sizes = np.full(len(self.nodes), 400.0)
+        self.back_sizes = np.full(len(self.nodes), 400.0)
+        self.front_artist = self.ax.scatter(self.xy[:, 0], self.xy[:, 1], s=self.front_sizes, c=self.front_colors,
+                                            zorder=2, animated=True)
+        self.back_artist = self.ax.scatter(self.xy[:, 0], self.xy[:, 1], s=self.back_sizes, c=self.back_colors,
+                                           zorder=3, animated=True)
+        self.node_labels = [self.ax.text(x, y, str(node), ha='center', va='center', zorder=4, animated=True,
+                                         visible=False)
+                            for node, (x, y) in zip(self.nodes, self.xy)]
+        # Edge labels are created the first time their edge shows up
+        self.edge_labels = {}
+        self.annotations = [self.figure.text(0.1, 0.08 - 0.035 * i, '', fontsize=12, animated=True, visible=False)
+                            for i in range(3)]
+
+        self.front_state = {}
+        self.back_state = {}
+        self.edge_state = {}
+        self.label_state = {}
+
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+    def edge_label(self, idx):
+        label = self.edge_labels.get(idx)
+        if label is None:
+            (x1, y1), (x2, y2) = self.ax.transData.transform(self.xy[[self.node_index[n] for n in self.edges[idx]]])
+            angle = math.degrees(math.atan2(y2 - y1, x2 - x1))
+            if angle > 90:
+                angle -= 180
+            elif angle < -90:
+                angle += 180
+            x, y = self.xy[[self.node_index[n] for n in self.edges[idx]]].mean(axis=0)
+            label = self.ax.text(x, y, f'{self.weights[idx]:.0f}', ha='center', va='center', rotation=angle,
+                                 rotation_mode='anchor', zorder=5, animated=True,
+                                 bbox=dict(boxstyle='round', ec=(1.0, 1.0, 1.0), fc=(1.0, 1.0, 1.0)))
+            self.edge_labels[idx] = label
+        return label
+
+    @staticmethod
+    def apply(current, wanted, update):
+        """
+        Calls update(key, value) for every key whose value differs between the previous and the wanted state, and
+        update(key, None) for every key that is no longer wanted.
+        """
+        for key, value in wanted.items():
+            if current.get(key) != value:
+                update(key, value)
+        for key in current.keys() - wanted.keys():
+            update(key, None)
+
+    def render(self, fronted_graph, backed_graph, path_edges=None):
+        """
+        Render one frame.
+
+        :param fronted_graph: The forward search tree.
+        :param backed_graph: The backward search tree.
+        :param path_edges: The (u, v) edges of the solution path, for the final frame.
+        :return: Base64 string of the PNG frame.
+        """
+        return self.render_frame(fronted_graph.nodes, fronted_graph.edges(), backed_graph.nodes, backed_graph.edges(),
+                                 path_edges)
+
+    def render_frame(self, front_nodes, front_edges, back_nodes, back_edges, path_edges=None):
+        """
+        Render one frame from the nodes and (u, v) edges of both search trees.
+
+        :return: Base64 string of the PNG frame.
+        """
+        return encode_png(self.render_pixels(front_nodes, front_edges, back_nodes, back_edges, path_edges))
+
+    def render_pixels(self, front_nodes, front_edges, back_nodes, back_edges, path_edges=None):
+        """
+        Render one frame like render_frame, without encoding it.
+
+        :return: (height, width, 4) uint8 RGBA array, owned by the caller.
+        """
+        final = path_edges is not None
+        path_set = set()
+        if final:
+            for i, j in path_edges:
+                path_set.add((i, j))
+                path_set.add((j, i))
+
+        front = {node: ('green', 400.0) for node in front_nodes}
+        back = {node: ('red', 200.0 if final else 400.0) for node in back_nodes}
+        edges = {}
+        for tree_edges in (front_edges, back_edges):
+            for u, v in tree_edges:
+                color = 'black'
+                if final:
+                    color = 'lightgreen' if (u, v) in path_set else 'grey'
+                edges[self.edge_index[(u, v)]] = (color, 2.0 if final else 1.0)
+        labels = {node: ('white', 8 if final else 16) for node in front}
+        labels.update({node: ('white' if final else 'black', 8 if final else 16) for node in back})
+
+        def update_front(node, value):
+            idx = self.node_index[node]
+            self.front_colors[idx] = to_rgba(value[0]) if value else TRANSPARENT
+            self.front_sizes[idx] = value[1] if value else 0.0
+
+        def update_back(node, value):
+            idx = self.node_index[node]
+            self.back_colors[idx] = to_rgba(value[0]) if value else TRANSPARENT
+            self.back_sizes[idx] = value[1] if value else 0.0
+
+        def update_edge(idx, value):
+            self.edge_colors[idx] = to_rgba(value[0]) if value else TRANSPARENT
+            self.edge_widths[idx] = value[1] if value else 1.0
+            self.edge_label(idx).set_visible(value is not None)
+
+        def update_label(node, value):
+            label = self.node_labels[self.node_index[node]]
+            label.set_visible(value is not None)
+            if value:
+                label.set_color(value[0])
+                label.set_fontsize(value[1])
+
+        self.apply(self.front_state, front, update_front)
+        self.apply(self.back_state, back, update_back)
+        self.apply(self.edge_state, edges, update_edge)
+        self.apply(self.label_state, labels, update_label)
+        self.front_state, self.back_state, self.edge_state, self.label_state = front, back, edges, labels
+
+        self.front_artist.set_facecolors(self.front_colors)
+        self.front_artist.set_sizes(self.front_sizes)
+        self.back_artist.set_facecolors(self.back_colors)
+        self.back_artist.set_sizes(self.back_sizes)
+        self.edge_artist.set_colors(self.edge_colors)
+        self.edge_artist.set_linewidths(self.edge_widths)
+
+        for annotation in self.annotations:
+            annotation.set_visible(final)
+        if final:
+            total_cost = sum(self.weights[self.edge_index[(i, j)]] for i, j in path_edges)
+            self.annotations[0].set_text(f'Total Cost: {total_cost}')
+            self.annotations[1].set_text(f'Total Front Nodes: {len(front)}')
+            self.annotations[2].set_text(f'Total Back Nodes: {len(back)}')
+
+        self.canvas.restore_region(self.background)
+        self.ax.draw_artist(self.edge_artist)
+        self.ax.draw_artist(self.front_artist)
+        self.ax.draw_artist(self.back_artist)
+        for idx in edges:
+            self.ax.draw_artist(self.edge_labels[idx])
+        for node in labels:
+            self.ax.draw_artist(self.node_labels[self.node_index[node]])
+        if final:
+            for annotation in self.annotations:
+                self.figure.draw_artist(annotation)
+
+        return np.array(self.canvas.buffer_rgba())
+
+
+def encode_png(pixels):
+    """
+    Encode an RGBA array as a base64 PNG.
+    """
+    iobytes = io.BytesIO()
+    mpimg.imsave(iobytes, pixels, format='png')
+    iobytes.seek(0)
+    return base64.b64encode(iobytes.read()).decode()
+
+
+class FrameEncoder:
+    """
+    Encodes a sequence of rendered frames for the 'delta' output mode. Every keyframe_interval-th frame is a keyframe,
+    sent as a whole PNG, and every other frame only as a patch against the frame before it: the bounding box of the
+    pixels that changed, as a PNG in which the unchanged pixels are transparent. Consecutive frames differ in a few
+    nodes and edges, so the patches are much smaller than whole frames and mostly transparent, which PNG compresses
+    very well. Drawing the patch at (x, y) over the previous frame gives the frame back, so the frames are decoded in
+    order starting from the last keyframe.
+
+    >>> encoder = FrameEncoder(keyframe_interval=10)
+    >>> first = np.full((4, 4, 4), 255, dtype=np.uint8)
+    >>> second = first.copy()
+    >>> second[1:3, 2] = (0, 128, 0, 255)
+    >>> sorted(encoder.encode(first))
+    ['photo']
+    >>> patch = encoder.encode(second)
+    >>> patch['base'], patch['x'], patch['y'], patch['width'], patch['height']
+    (0, 2, 1, 1, 2)
+    >>> encoder.encode(second.copy())['patch'] is None
+    True
+
+    :param keyframe_interval: Number of frames from one keyframe to the next.
+    :param first_index: Index of the first encoded frame in the whole demonstration, for frames encoded in chunks.
+    """
+
+    def __init__(self, keyframe_interval, first_index=0):
+        self.keyframe_interval = max(keyframe_interval, 1)
+        self.index = first_index
+        self.count = 0
+        self.previous = None
+
+    def encode(self, pixels):
+        """
+        Encode the next frame.
+
+        :param pixels: The RGBA array of the frame.
+        :return: JSON serializable dict: {'photo'} for a keyframe, or {'base', 'x', 'y', 'width', 'height', 'patch'}
+            where base is the index of the frame the patch applies to and patch is None when nothing changed.
+        """
+        previous, self.previous = self.previous, pixels
+        index = self.index
+        self.index += 1
+        self.count += 1
+        if previous is None or (self.count - 1) % self.keyframe_interval == 0:
+            return {'photo': encode_png(pixels)}
+
+        changed = (pixels != previous).any(axis=2)
+        rows, columns = np.flatnonzero(changed.any(axis=1)), np.flatnonzero(changed.any(axis=0))
+        if not rows.size:
+            return {'base': index - 1, 'x': 0, 'y': 0, 'width': 0, 'height': 0, 'patch': None}
+        top, bottom, left, right = rows[0], rows[-1] + 1, columns[0], columns[-1] + 1
+        patch = pixels[top:bottom, left:right].copy()
+        patch[~changed[top:bottom, left:right]] = 0
+        return {'base': index - 1, 'x': int(left), 'y': int(top), 'width': int(right - left),
+                'height': int(bottom - top), 'patch': encode_png(patch)}
+
+
+def capture_frame(fronted_tree, backed_tree, path_edges=None):
+    """
+    Describe the current state of both FrontierTrees as a Frame.
+    """
+    return Frame(*fronted_tree.snapshot(), *backed_tree.snapshot(), path_edges)
+
+
+def graph_layout(graph_vis):
+    """
+    Describe the graph once for drawing it in the browser: the position of every node, every weighted edge and the
+    two endpoints of the search.
+
+    :param graph_vis: The GraphVisualization holding the graph and its layout.
+    :return: JSON serializable dict with 'nodes' ([node, x, y] lists), 'edges' ([u, v, weight] lists), 'start' and
+        'goal'.
+    """
+    return {'nodes': [[node, float(graph_vis.pos[node][0]), float(graph_vis.pos[node][1])] for node in graph_vis.G],
+            'edges': [[u, v, weight] for u, v, weight in graph_vis.G.edges(data='weight', default=1.0)],
+            'start': graph_vis.start_node, 'goal': graph_vis.goal_node}
+
+
+def frame_deltas(fronted_tree, backed_tree, frames):
+    """
+    Describe each frame by what changed since the previous one, for drawing the frames in the browser: the nodes and
+    (u, v) edges that joined each tree, and the solution path in the final frame.
+
+    >>> from app.FrontierTree import FrontierTree
+    >>> from py_search.base import Node
+    >>> front, back = FrontierTree(), FrontierTree()
+    >>> front.add(Node(0))
+    >>> first = capture_frame(front, back)
+    >>> front.add(Node(1, Node(0), (0, 1), 2.0))
+    >>> frame_deltas(front, back, [first, capture_frame(front, back, [(0, 1)])])[1]
+    {'front_nodes': [1], 'front_edges': [[0, 1]], 'back_nodes': [], 'back_edges': [], 'path': [[0, 1]]}
+
+    :param fronted_tree: The final forward FrontierTree.
+    :param backed_tree: The final backward FrontierTree.
+    :param frames: List of Frame descriptions.
+    :return: List of JSON serializable dicts, one per frame.
+    """
+    deltas = []
+    previous = Frame(0, 0, 0, 0, None)
+    for frame in frames:
+        deltas.append({
+            'front_nodes': fronted_tree.node_order[previous.front_nodes:frame.front_nodes],
+            'front_edges': [list(edge) for edge in fronted_tree.edge_order[previous.front_edges:frame.front_edges]],
+            'back_nodes': backed_tree.node_order[previous.back_nodes:frame.back_nodes],
+            'back_edges': [list(edge) for edge in backed_tree.edge_order[previous.back_edges:frame.back_edges]],
+            'path': None if frame.path_edges is None else [list(edge) for edge in frame.path_edges],
+        })
+        previous = frame
+    return deltas
+
+
+_worker_renderer = (None, None)
+# Pool of the processes rendering frames
+render_pool = ProcessPool()
+
+
+def _render_chunk(token, graph_vis, front, back, frames, encoding='png', first_index=0):
+    """
+    Render a contiguous run of frames in a worker. The renderer is kept between the chunks of one request. In the
+    'delta' encoding each chunk starts with a keyframe, so chunks are encoded independently.
+    """
+    global _worker_renderer
+    if _worker_renderer[0] != token:
+        _worker_renderer = (token, GraphRenderer(graph_vis))
+    renderer = _worker_renderer[1]
+    (front_nodes, front_edges), (back_nodes, back_edges) = front, back
+    if encoding == 'delta':
+        encoder = FrameEncoder(config.Config.KEYFRAME_INTERVAL, first_index)
+
+        def draw(*args):
+            return encoder.encode(renderer.render_pixels(*args))
+    else:
+        draw = renderer.render_frame
+    return [draw(front_nodes[:frame.front_nodes], front_edges[:frame.front_edges], back_nodes[:frame.back_nodes],
+                 back_edges[:frame.back_edges], frame.path_edges)
+            for frame in frames]
+
+
+def render_frames(graph_vis, fronted_tree, backed_tree, frames, processes=None, encoding='png'):
+    """
+    Render the described frames, in parallel when more than one process is configured. The frames are split into one
+    contiguous chunk per process, so each worker still benefits from only updating what changed between frames.
+
+    :param graph_vis: The GraphVisualization holding the graph and its layout.
+    :param fronted_tree: The final forward FrontierTree.
+    :param backed_tree: The final backward FrontierTree.
+    :param frames: List of Frame descriptions.
+    :param processes: Number of rendering processes (defaults to Config.RENDER_PROCESSES).
+    :param encoding: 'png' for whole PNG frames, or 'delta' for keyframes and patches (see FrameEncoder).
+    :return: List of base64 PNG frames, or of FrameEncoder dicts, in the order of frames.
+    """
+    if processes is None:
+        processes = config.Config.RENDER_PROCESSES
+    processes = min(processes, len(frames))
+    front = (fronted_tree.node_order, fronted_tree.edge_order)
+    back = (backed_tree.node_order, backed_tree.edge_order)
+    token = uuid.uuid4().hex
+
+    if processes <= 1:
+        return _render_chunk(token, graph_vis, front, back, frames, encoding)
+
+    bounds = [len(frames) * i // processes for i in range(processes + 1)]
+    chunks = [(token, graph_vis, front, back, frames[start:end], encoding, start)
+              for start, end in zip(bounds, bounds[1:])]
+    return [photo for photos in render_pool.run(processes, _render_chunk, chunks)
+            for photo in photos]
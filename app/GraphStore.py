@@ -0,0 +1,201 @@
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import config
+from app.GraphVis import GraphVisualization
+
+
+class GraphStore:
+    """
+    Server-side storage for the GraphVisualization of each session. The session cookie only holds the opaque id
+    returned by put, so the cookie size does not depend on the graph and requests don't re-upload it.
+
+    Entries expire ttl seconds after they were last used, and the least recently used entries are evicted once the
+    stored graphs exceed max_bytes.
+    """
+
+    def __init__(self, ttl, max_bytes):
+        """
+        :param ttl: Seconds an unused graph is kept.
+        :param max_bytes: Approximate memory (or disk) cap for all stored graphs.
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def new_id():
+        return secrets.token_urlsafe(16)
+
+    def get(self, graph_id):
+        """
+        Return the stored GraphVisualization, or None if the id is unknown or expired. Callers must not modify the
+        returned object in place; store a modified copy with put instead.
+        """
+        raise NotImplementedError("No get method")
+
+    def put(self, graph_vis, graph_id=None):
+        """
+        Store a GraphVisualization under graph_id (a new id if None) and return the id.
+        """
+        raise NotImplementedError("No put method")
+
+    def delete(self, graph_id):
+        raise NotImplementedError("No delete method")
+
+
+class MemoryGraphStore(GraphStore):
+    """
+    In-process LRU store. Graphs are kept as live objects, so reading one costs no deserialization at all. Its size is
+    estimated by its serialized size when it is stored.
+
+    >>> graph_vis = GraphVisualization()
+    >>> graph_vis.add_edges_and_nodes([0, 1], [(0, 1, 1.0)])
+    >>> store = MemoryGraphStore(ttl=60, max_bytes=1024)
+    >>> graph_id = store.put(graph_vis)
+    >>> store.get(graph_id).edges
+    [(0, 1, 1.0)]
+    >>> store.get('unknown') is None
+    True
+    """
+
+    def __init__(self, ttl, max_bytes):
+        super().__init__(ttl, max_bytes)
+        self.graphs = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def _purge(self, now):
+        # Entries are ordered by last use, which is also the order in which they expire
+        while self.graphs:
+            graph_id, (_, size, expires) = next(iter(self.graphs.items()))
+            if expires > now and self.size <= self.max_bytes:
+                break
+            del self.graphs[graph_id]
+            self.size -= size
+
+    def get(self, graph_id):
+        now = time.time()
+        with self.lock:
+            self._purge(now)
+            entry = self.graphs.get(graph_id)
+            if entry is None:
+                return None
+            graph_vis, size, _ = entry
+            self.graphs[graph_id] = (graph_vis, size, now + self.ttl)
+            self.graphs.move_to_end(graph_id)
+            return graph_vis
+
+    def put(self, graph_vis, graph_id=None):
+        graph_id = graph_id or self.new_id()
+        size = len(graph_vis.to_bytes())
+        now = time.time()
+        with self.lock:
+            self._delete(graph_id)
+            self.graphs[graph_id] = (graph_vis, size, now + self.ttl)
+            self.size += size
+            self._purge(now)
+        return graph_id
+
+    def _delete(self, graph_id):
+        entry = self.graphs.pop(graph_id, None)
+        if entry is not None:
+            self.size -= entry[1]
+
+    def delete(self, graph_id):
+        with self.lock:
+            self._delete(graph_id)
+
+
+class SqliteGraphStore(GraphStore):
+    """
+    On-disk store in a SQLite database, shared by every process of the server and kept across restarts. Graphs are
+    stored in the GraphVisualization binary format.
+
+    >>> graph_vis = GraphVisualization()
+    >>> graph_vis.add_edges_and_nodes([0, 1], [(0, 1, 1.0)])
+    >>> store = SqliteGraphStore(':memory:', ttl=60, max_bytes=1024)
+    >>> graph_id = store.put(graph_vis)
+    >>> store.get(graph_id).edges
+    [(0, 1, 1.0)]
+    """
+
+    def __init__(self, path, ttl, max_bytes):
+        """
+        :param path: The database file.
+        """
+        super().__init__(ttl, max_bytes)
+        self.path = path
+        self.lock = threading.Lock()
+        # An in-memory database only lives as long as its connection
+        self.shared_connection = sqlite3.connect(path, check_same_thread=False) if path == ':memory:' else None
+        with self.connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS graphs '
+                               '(id TEXT PRIMARY KEY, data BLOB NOT NULL, expires REAL NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS graphs_expires ON graphs (expires)')
+
+    @contextmanager
+    def connect(self):
+        """
+        Yield a connection inside a transaction that is committed when the block succeeds.
+        """
+        connection = self.shared_connection or sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            if connection is not self.shared_connection:
+                connection.close()
+
+    @staticmethod
+    def serialize(graph_vis):
+        return graph_vis.to_bytes()
+
+    @staticmethod
+    def deserialize(data):
+        return GraphVisualization.from_bytes(data)
+
+    def get(self, graph_id):
+        now = time.time()
+        with self.lock, self.connect() as connection:
+            row = connection.execute('SELECT data FROM graphs WHERE id = ? AND expires > ?',
+                                     (graph_id, now)).fetchone()
+            if row is None:
+                return None
+            connection.execute('UPDATE graphs SET expires = ? WHERE id = ?', (now + self.ttl, graph_id))
+        return self.deserialize(row[0])
+
+    def put(self, graph_vis, graph_id=None):
+        graph_id = graph_id or self.new_id()
+        data = self.serialize(graph_vis)
+        now = time.time()
+        with self.lock, self.connect() as connection:
+            connection.execute('INSERT OR REPLACE INTO graphs (id, data, expires) VALUES (?, ?, ?)',
+                               (graph_id, data, now + self.ttl))
+            connection.execute('DELETE FROM graphs WHERE expires <= ?', (now,))
+            # Evict the least recently used graphs beyond the size cap
+            connection.execute('DELETE FROM graphs WHERE id IN ('
+                               ' SELECT id FROM (SELECT id, SUM(LENGTH(data)) OVER (ORDER BY expires DESC) AS total'
+                               '  FROM graphs) WHERE total > ?)', (self.max_bytes,))
+        return graph_id
+
+    def delete(self, graph_id):
+        with self.lock, self.connect() as connection:
+            connection.execute('DELETE FROM graphs WHERE id = ?', (graph_id,))
+
+
+def create_graph_store(settings):
+    """
+    Create the graph store selected by settings.GRAPH_STORE ('memory' or 'sqlite').
+    """
+    if settings.GRAPH_STORE == 'memory':
+        return MemoryGraphStore(settings.GRAPH_STORE_TTL, settings.GRAPH_STORE_MAX_BYTES)
+    if settings.GRAPH_STORE == 'sqlite':
+        return SqliteGraphStore(settings.GRAPH_STORE_PATH, settings.GRAPH_STORE_TTL, settings.GRAPH_STORE_MAX_BYTES)
+    raise ValueError(f"Unknown graph store: {settings.GRAPH_STORE}")
+
+
+graph_store = create_graph_store(config.Config)
@@ -1,13 +1,29 @@
 import base64
 import io
+import struct
 from matplotlib import pyplot as plt
 import networkx as nx
+import numpy as np
 import random
 
-from app.GraphProblem import rank_dict_by_values
+from app.CsrGraph import CsrGraph
+from app.GraphLayout import place_new_nodes
+from app.HeuristicCache import graph_fingerprint, heuristic_cache
+
+# Binary serialization: a fixed header followed by 8-byte aligned arrays, see GraphVisualization.to_bytes
+SERIALIZATION_MAGIC = b'NBSG'
+SERIALIZATION_VERSION = 1
+SERIALIZATION_HEADER = struct.Struct('<4sHHqqqq')  # magic, version, flags, start, goal, nodes, edges
+FLAG_EDGES = 1  # edges is not None
+FLAG_FLOAT64_WEIGHTS = 2  # some weight is not exactly representable as float32
+FLAG_H_F = 4
+FLAG_H_B = 8
 
 
 class GraphVisualization:
+    # Graphs up to this size pick their endpoints with the exact all-pairs search
+    EXACT_ENDPOINTS_MAX_NODES = 200
+
     def __init__(self):
         self.H_b = None
         self.H_f = None
@@ -16,6 +32,25 @@ class GraphVisualization:
         self.start_node = 0
         self.goal_node = 0
         self.G = nx.Graph()
+        # Arrays of a graph loaded with from_bytes that G and edges have not been built from yet
+        self._pending = None
+
+    def __getattr__(self, name):
+        # Only called for missing attributes: G and edges of a graph loaded with from_bytes are built on first use
+        pending = self.__dict__.get('_pending')
+        if pending is None or name not in ('G', 'edges'):
+            raise AttributeError(name)
+        self._materialize()
+        return getattr(self, name)
+
+    def _materialize(self):
+        nodes, sources, targets, weights, has_edges = self._pending
+        self._pending = None
+        edges = list(zip(nodes[sources].tolist(), nodes[targets].tolist(), weights.tolist()))
+        self.edges = edges if has_edges else None
+        self.G = nx.Graph()
+        self.G.add_nodes_from(nodes.tolist())
+        self.G.add_weighted_edges_from(edges)
 
     def generate_random_graph(self, num_nodes):
         self.__init__()
@@ -31,23 +66,57 @@ class GraphVisualization:
         self.add_edges_and_nodes(nodes=range(num_nodes), edges=edges)
 
         # Find the two farthest nodes
-        all_distances = {}
-        for node in self.G.nodes():
-            lengths = nx.multi_source_dijkstra_path_length(self.G, {node})
-            for target, length in lengths.items():
-                all_distances[(node, target)] = length
-        farthest_pair = max(all_distances, key=all_distances.get)
-
-        self.start_node, self.goal_node = farthest_pair
+        self.start_node, self.goal_node = self.find_farthest_pair()
 
         # Calculate the shortest path lengths from each node to the start and goal nodes
-        single_src_dijkstra_forward = nx.single_source_dijkstra_path_length(self.G, int(self.goal_node),
-                                                                            weight='weight')
-        self.H_f = rank_dict_by_values(single_src_dijkstra_forward)
-        single_src_dijkstra_backward = nx.single_source_dijkstra_path_length(self.G, int(self.start_node),
-                                                                             weight='weight')
-        self.H_b = rank_dict_by_values(single_src_dijkstra_backward)
-        self.pos = nx.spring_layout(self.G)
+        fingerprint = graph_fingerprint(self.G)
+        self.H_f = heuristic_cache.get(self.G, self.goal_node, fingerprint)
+        self.H_b = heuristic_cache.get(self.G, self.start_node, fingerprint)
+
+    def find_farthest_pair(self, exact=None, max_sweeps=4):
+        """
+        Find a pair of nodes that are (approximately) the farthest apart.
+
+        The exact mode runs Dijkstra from every node, keeping only a running maximum, which is O(n*m log n) time.
+        Otherwise the pair is estimated with iterated double sweeps: starting from the first node, repeatedly jump to
+        the node farthest from the current one until the distance stops growing. Each sweep is one vectorized shortest
+        path pass over the CSR arrays, so this stays well under a second at 100k nodes. The estimate stays within the
+        first node's connected component.
+
+        :param exact: Force the exact (True) or the estimated (False) mode. Defaults to exact for graphs of at most
+            EXACT_ENDPOINTS_MAX_NODES nodes.
+        :param max_sweeps: Maximum number of sweeps in the estimated mode.
+        :return: Tuple (start_node, goal_node).
+        """
+        if exact is None:
+            exact = self.G.number_of_nodes() <= self.EXACT_ENDPOINTS_MAX_NODES
+
+        if exact:
+            farthest_pair, farthest_length = None, -1
+            for node in self.G.nodes():
+                lengths = nx.single_source_dijkstra_path_length(self.G, node, weight='weight')
+                for target, length in lengths.items():
+                    if length > farthest_length:
+                        farthest_pair, farthest_length = (node, target), length
+            return farthest_pair
+
+        csr = CsrGraph.from_networkx(self.G)
+        labels = csr.labels.tolist()
+
+        def farthest_from(label):
+            dist = csr.shortest_path_lengths(label)
+            dist[np.isinf(dist)] = -1
+            idx = int(np.argmax(dist))
+            return labels[idx], dist[idx]
+
+        start = labels[0]
+        goal, farthest_length = farthest_from(start)
+        for _ in range(max_sweeps - 1):
+            candidate, length = farthest_from(goal)
+            if length <= farthest_length:
+                break
+            start, goal, farthest_length = goal, candidate, length
+        return start, goal
 
     def add_edges_and_nodes(self, nodes, edges):
         self.G = nx.Graph()
@@ -57,10 +126,8 @@ class GraphVisualization:
         for edge in edges:
             self.G.add_edge(int(edge[0]), int(edge[1]), weight=edge[2])  # Ensure nodes are integers
 
-        for node in self.G.nodes():
-            if node not in self.pos.keys():
-                self.pos = nx.spring_layout(self.G)
-                break
+        # Nodes that already have a position keep it, only new nodes are placed
+        self.pos = place_new_nodes(self.G, self.pos)
 
     def filter_graph(self, keep_nodes):
         """
@@ -68,12 +135,16 @@ class GraphVisualization:
 
         :param keep_nodes: List of nodes to keep in the graph.
         """
-        keep_edges = []
+        # Nodes share their ancestors, so every chain is only walked up to the first node seen before
+        keep_edges = set()
+        walked = set()
         for node in keep_nodes:
-            for edge_str in node.path():
-                i, j = map(int, edge_str.split(' -> '))
-                keep_edges.append((i, j))
-                keep_edges.append((j, i))
+            while node.parent is not None and id(node) not in walked:
+                walked.add(id(node))
+                i, j = node.action
+                keep_edges.add((i, j))
+                keep_edges.add((j, i))
+                node = node.parent
 
         # print(f"keep_edges: {keep_edges}")
         keep_nodes = [n.state for n in keep_nodes]
@@ -143,10 +214,8 @@ class GraphVisualization:
             total_front_nodes = len(fronted_graph.nodes)
             total_back_nodes = len(backed_graph.nodes)
 
-            # Convert path_edges from strings to tuples
             path_edges_tuples = []
-            for edge_str in path_edges:
-                i, j = map(int, edge_str.split(' -> '))
+            for i, j in path_edges:
                 path_edges_tuples.append((i, j))
                 path_edges_tuples.append((j, i))
                 # Calculate total cost
@@ -230,3 +299,108 @@ class GraphVisualization:
         """
         return self.pos
 
+    def to_bytes(self):
+        """
+        Serialize the graph to a compact, versioned binary format. After a fixed header come, each padded to 8
+        bytes: the node labels (int64), the edge endpoints as int32 indices into the node labels, the edge weights
+        (float32, or float64 if float32 would round any of them), the layout as a float32 (nodes, 2) array (NaN for
+        nodes without a position) and the H_f and H_b ranks as int32 arrays (-1 for missing nodes).
+
+        Unlike a pickle, the data can't execute code when it is loaded.
+
+        :return: bytes
+        """
+        nodes = np.fromiter(self.G.nodes(), dtype=np.int64, count=self.G.number_of_nodes())
+        index = {node: idx for idx, node in enumerate(nodes.tolist())}
+        edges = self.edges or []
+        sources = np.fromiter((index[int(u)] for u, v, w in edges), dtype=np.int32, count=len(edges))
+        targets = np.fromiter((index[int(v)] for u, v, w in edges), dtype=np.int32, count=len(edges))
+        weights = np.fromiter((w for u, v, w in edges), dtype=np.float64, count=len(edges))
+
+        flags = 0
+        if self.edges is not None:
+            flags |= FLAG_EDGES
+        if np.array_equal(weights.astype(np.float32), weights):
+            weights = weights.astype(np.float32)
+        else:
+            flags |= FLAG_FLOAT64_WEIGHTS
+
+        pos = np.full((len(nodes), 2), np.nan, dtype=np.float32)
+        for node, xy in self.pos.items():
+            if node in index:
+                pos[index[node]] = xy
+
+        arrays = [nodes, sources, targets, weights, pos]
+        for flag, ranks in ((FLAG_H_F, self.H_f), (FLAG_H_B, self.H_b)):
+            if ranks is not None:
+                flags |= flag
+                arrays.append(np.array([ranks.get(node, -1) for node in nodes.tolist()], dtype=np.int32))
+
+        header = SERIALIZATION_HEADER.pack(SERIALIZATION_MAGIC, SERIALIZATION_VERSION, flags, int(self.start_node),
+                                           int(self.goal_node), len(nodes), len(edges))
+        chunks = [header]
+        for array in arrays:
+            data = array.tobytes()
+            chunks.append(data)
+            chunks.append(b'\0' * (-len(data) % 8))
+        return b''.join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Load a graph serialized with to_bytes. The arrays are read in place with numpy.frombuffer, without copying,
+        and the networkx graph and the edge list are only built from them when G or edges is first used.
+
+        :param data: bytes (or any buffer) produced by to_bytes.
+        :return: GraphVisualization
+        :raises ValueError: if the data is not a serialized graph of a supported version, or is truncated or corrupt.
+        """
+        if len(data) < SERIALIZATION_HEADER.size:
+            raise ValueError("Truncated graph data")
+        magic, version, flags, start_node, goal_node, n_nodes, n_edges = SERIALIZATION_HEADER.unpack_from(data)
+        if magic != SERIALIZATION_MAGIC:
+            raise ValueError("Not a serialized graph")
+        if version != SERIALIZATION_VERSION:
+            raise ValueError(f"Unsupported graph serialization version: {version}")
+        if n_nodes < 0 or n_edges < 0:
+            raise ValueError("Corrupt graph data: negative node or edge count")
+
+        offset = SERIALIZATION_HEADER.size
+
+        def read(dtype, count, shape=None):
+            nonlocal offset
+            array = np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+            offset += array.nbytes + (-array.nbytes % 8)
+            return array if shape is None else array.reshape(shape)
+
+        try:
+            nodes = read(np.int64, n_nodes)
+            sources = read(np.int32, n_edges)
+            targets = read(np.int32, n_edges)
+            weights = read(np.float64 if flags & FLAG_FLOAT64_WEIGHTS else np.float32, n_edges)
+            pos = read(np.float32, n_nodes * 2, (n_nodes, 2))
+            H_f = read(np.int32, n_nodes) if flags & FLAG_H_F else None
+            H_b = read(np.int32, n_nodes) if flags & FLAG_H_B else None
+        except ValueError:
+            raise ValueError("Truncated graph data")
+        if offset != len(data):
+            raise ValueError(f"Corrupt graph data: {len(data) - offset} trailing bytes")
+        # Check the edge endpoints now rather than when the graph is built from them on first use
+        for indices in (sources, targets):
+            if n_edges and (indices.min() < 0 or indices.max() >= n_nodes):
+                raise ValueError("Corrupt graph data: edge endpoint out of range")
+
+        graph_vis = cls.__new__(cls)
+        graph_vis.start_node = start_node
+        graph_vis.goal_node = goal_node
+        graph_vis._pending = (nodes, sources, targets, weights, bool(flags & FLAG_EDGES))
+        labels = nodes.tolist()
+        pos = pos.astype(np.float64)
+        positioned = ~np.isnan(pos).any(axis=1)
+        graph_vis.pos = dict(zip(nodes[positioned].tolist(), pos[positioned]))
+        graph_vis.H_f = graph_vis.H_b = None
+        if H_f is not None:
+            graph_vis.H_f = {node: rank for node, rank in zip(labels, H_f.tolist()) if rank >= 0}
+        if H_b is not None:
+            graph_vis.H_b = {node: rank for node, rank in zip(labels, H_b.tolist()) if rank >= 0}
+        return graph_vis
@@ -0,0 +1,134 @@
+import math
+
+import numpy as np
+
+from py_search.base import GoalNode, Node, Problem
+
+# (row offset, column offset, length) of the moves of 4- and 8-connected grids
+MOVES_4 = ((-1, 0, 1.0), (0, -1, 1.0), (0, 1, 1.0), (1, 0, 1.0))
+MOVES_8 = MOVES_4 + ((-1, -1, math.sqrt(2)), (-1, 1, math.sqrt(2)), (1, -1, math.sqrt(2)), (1, 1, math.sqrt(2)))
+
+
+class GridProblem(Problem):
+    """
+    Shortest path between two cells of a weighted grid map, without building a graph. The grid is a 2D NumPy array
+    of cell costs: a move into a cell costs the cell's cost times the length of the move (1, or sqrt(2) for diagonal
+    moves), and cells with a negative or non-finite cost are blocked. Successors and predecessors are computed from
+    the cell index arithmetically, so the search only allocates the nodes it actually generates.
+
+    States are the flat indices row * columns + column and actions are (from, to) index pairs, like the node ids and
+    edges of GraphProblem, so both problems can be searched, traced and drawn the same way.
+
+    >>> from py_search.base import SolutionNode
+    >>> from py_search.informed import near_optimal_front_to_end_bidirectional_search
+    >>> costs = np.ones((3, 3))
+    >>> costs[:2, 1] = np.inf
+    >>> problem = GridProblem(costs, (0, 0), (0, 2))
+    >>> solution = next(node for node in near_optimal_front_to_end_bidirectional_search(problem)
+    ...                 if isinstance(node, SolutionNode))
+    >>> solution.cost(), [problem.cell(v) for u, v in solution.path()]
+    (6.0, [(1, 0), (2, 0), (2, 1), (2, 2), (1, 2), (0, 2)])
+    >>> problem = GridProblem(costs, (0, 0), (0, 2), dense_closed=True)
+    >>> next(node for node in near_optimal_front_to_end_bidirectional_search(problem)
+    ...      if isinstance(node, SolutionNode)).cost()
+    6.0
+    """
+
+    def __init__(self, costs, start, goal, connectivity=4, dense_closed=False):
+        """
+        :param costs: 2D array of cell costs. It is used as is, not copied.
+        :param start: The (row, column) of the start cell.
+        :param goal: The (row, column) of the goal cell.
+        :param connectivity: 4 (horizontal and vertical moves) or 8 (also diagonal moves, which may not cut the
+            corner of a blocked cell).
+        :param dense_closed: Keep the closed lists in arrays covering the whole grid (see DenseClosedList) instead of
+            dicts of the generated cells. Array lookups are faster, but each direction allocates 24 bytes per cell up
+            front, so this only pays off when a search is expected to reach a large part of the grid.
+        :raises ValueError: if the connectivity is not 4 or 8, or start or goal is outside the grid or blocked.
+        """
+        if connectivity not in (4, 8):
+            raise ValueError(f"Connectivity must be 4 or 8, received: {connectivity}")
+        costs = np.asarray(costs, dtype=np.float64)
+        self.rows, self.columns = costs.shape
+        self.costs = costs.ravel()
+        self.moves = MOVES_4 if connectivity == 4 else MOVES_8
+        for cell in (start, goal):
+            if not self.passable(*cell):
+                raise ValueError(f"Cell {cell} is outside the grid or blocked.")
+        super().__init__(self.index(*start), self.index(*goal))
+        # Every move costs at least its length times the cheapest cell cost, which scales the distance heuristic
+        passable = costs[np.isfinite(costs) & (costs >= 0)]
+        self.min_cost = float(passable.min())
+        self.connectivity = connectivity
+        self.dense_closed = dense_closed
+
+    def state_space_size(self):
+        return self.rows * self.columns if self.dense_closed else None
+
+    def index(self, row, column):
+        return row * self.columns + column
+
+    def cell(self, state):
+        """
+        Returns the (row, column) of a state.
+        """
+        return divmod(state, self.columns)
+
+    def passable(self, row, column):
+        return 0 <= row < self.rows and 0 <= column < self.columns and \
+            0.0 <= self.costs.item(row * self.columns + column) < math.inf
+
+    def neighbors(self, state):
+        """
+        Yields the passable neighbors of a state with the length of the move to them. Moves are symmetric, so these
+        are both the successors and the predecessors.
+        """
+        row, column = divmod(state, self.columns)
+        for row_offset, column_offset, length in self.moves:
+            if not self.passable(row + row_offset, column + column_offset):
+                continue
+            if row_offset and column_offset and not (self.passable(row + row_offset, column) and
+                                                     self.passable(row, column + column_offset)):
+                continue
+            yield state + row_offset * self.columns + column_offset, length
+
+    def shortest_path_heuristic(self, state, forward):
+        """
+        Manhattan (4-connected) or octile (8-connected) distance to the goal (forward) or from the start (backward),
+        times the cheapest cell cost. It never overestimates, so the search finds optimal paths.
+        """
+        row, column = divmod(state, self.columns)
+        target_row, target_column = divmod(self.goal.state if forward else self.initial.state, self.columns)
+        rows, columns = abs(row - target_row), abs(column - target_column)
+        if self.connectivity == 4:
+            return self.min_cost * (rows + columns)
+        return self.min_cost * (max(rows, columns) + (math.sqrt(2) - 1) * min(rows, columns))
+
+    def node_value(self, node):
+        if isinstance(node, GoalNode):
+            return node.cost() + self.shortest_path_heuristic(node.state, forward=False)
+        else:
+            return node.cost() + self.shortest_path_heuristic(node.state, forward=True)
+
+    def successors(self, node):
+        """
+        Computes the successors of the given node, entering each neighbor cell at its cost.
+
+        :param node: The node to expand.
+        :return: Generator yielding successors as Node objects.
+        """
+        state, cost = node.state, node.cost()
+        for neighbor, length in self.neighbors(state):
+            yield Node(neighbor, node, (state, neighbor), cost + length * self.costs.item(neighbor))
+
+    def predecessors(self, goal_node):
+        """
+        Computes the predecessors of the given node: the neighbor cells from which its cell is entered.
+
+        :param goal_node: The node to expand backward.
+        :return: Generator yielding predecessors as GoalNode objects.
+        """
+        state, cost = goal_node.state, goal_node.cost()
+        entry_cost = self.costs.item(state)
+        for neighbor, length in self.neighbors(state):
+            yield GoalNode(neighbor, goal_node, (neighbor, state), cost + length * entry_cost)
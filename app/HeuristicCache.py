@@ -0,0 +1,159 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import networkx as nx
+
+import config
+
+
+def rank_dict_by_values(input_dict):
+    # Sort the dictionary by its values
+    sorted_items = sorted(input_dict.items(), key=lambda item: item[1])
+
+    # Initialize variables
+    rank = 0
+    last_value = None
+    rank_dict = {}
+
+    # Assign ranks
+    for idx, (key, value) in enumerate(sorted_items):
+        rank_dict[key] = rank
+        if value != last_value:
+            rank += 1
+        last_value = value
+
+    return rank_dict
+
+
+def graph_fingerprint(G, weight='weight'):
+    """
+    Stable hash of a graph's node set and weighted edge set. Two graphs with the same nodes and edges get the same
+    fingerprint regardless of insertion order.
+
+    :param G: The networkx graph.
+    :param weight: The edge attribute holding the weight.
+    :return: Hex digest string.
+    """
+    if G.is_directed():
+        edges = sorted((u, v, float(w)) for u, v, w in G.edges(data=weight, default=1.0))
+    else:
+        edges = sorted((min(u, v), max(u, v), float(w)) for u, v, w in G.edges(data=weight, default=1.0))
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(b'D' if G.is_directed() else b'U')
+    digest.update(repr(sorted(G.nodes())).encode())
+    digest.update(repr(edges).encode())
+    return digest.hexdigest()
+
+
+class FingerprintCache:
+    """
+    Thread-safe LRU cache of values derived from graphs, keyed by graph fingerprint (alone or in a tuple with whatever
+    else the value depends on), with an approximate memory cap. Values are computed outside the lock, so a slow miss
+    does not block hits on other graphs; two threads missing the same key at once both compute it and the first
+    result is kept.
+
+    >>> cache = FingerprintCache(max_bytes=10, value_size=len)
+    >>> cache.fetch('a', lambda: 'aaaa'), cache.fetch('b', lambda: 'bbbb'), cache.fetch('a', lambda: 'x')
+    ('aaaa', 'bbbb', 'aaaa')
+    >>> cache.fetch('c', lambda: 'cccc')
+    'cccc'
+    >>> list(cache.entries), cache.size, cache.hits, cache.misses
+    (['a', 'c'], 8, 1, 3)
+    """
+
+    def __init__(self, max_bytes, value_size):
+        """
+        :param max_bytes: Approximate memory cap for all cached values. The least recently used values are evicted
+            once it is exceeded, and values larger than the cap are not cached at all.
+        :param value_size: Function returning the approximate size of a value in bytes.
+        """
+        self.max_bytes = max_bytes
+        self.value_size = value_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def fetch(self, key, compute):
+        """
+        Return the value cached under key, or compute it with compute() and cache it.
+
+        :param key: The graph fingerprint, or a tuple starting with it.
+        :param compute: Function without parameters returning the value.
+        """
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = compute()
+        size = self.value_size(value)
+        with self.lock:
+            if key not in self.entries and size <= self.max_bytes:
+                self.entries[key] = value
+                self.size += size
+                while self.size > self.max_bytes:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.size -= self.value_size(evicted)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class HeuristicCache(FingerprintCache):
+    """
+    LRU cache of the ranked shortest path heuristic tables, keyed by graph fingerprint and the endpoint node the
+    distances are measured from. Different start/goal pairs on one graph share the table of each endpoint.
+
+    >>> G = nx.path_graph(3)
+    >>> cache = HeuristicCache(max_bytes=1024 * 1024)
+    >>> cache.get(G, 0)
+    {0: 0, 1: 1, 2: 2}
+    >>> cache.get(nx.path_graph(3), 0) is cache.get(G, 0)
+    True
+    >>> cache.hits, cache.misses
+    (2, 1)
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: Approximate memory cap for all cached tables.
+        """
+        super().__init__(max_bytes, self.table_size)
+
+    @staticmethod
+    def table_size(table):
+        # The dict itself plus one small int key and one small int value per entry
+        return sys.getsizeof(table) + len(table) * 2 * sys.getsizeof(2 ** 20)
+
+    def get(self, G, source, fingerprint=None):
+        """
+        Return the ranked distance table from source, computing and caching it on a miss. The returned dict is shared
+        between callers and must not be modified.
+
+        :param G: The networkx graph.
+        :param source: The endpoint node the distances are measured from.
+        :param fingerprint: The graph fingerprint, if the caller has already computed it.
+        """
+        if fingerprint is None:
+            fingerprint = graph_fingerprint(G)
+
+        def compute():
+            return rank_dict_by_values(nx.single_source_dijkstra_path_length(G, int(source), weight='weight'))
+
+        return self.fetch((fingerprint, int(source)), compute)
+
+
+heuristic_cache = HeuristicCache(config.Config.HEURISTIC_CACHE_MAX_BYTES)
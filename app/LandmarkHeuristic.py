@@ -0,0 +1,133 @@
+import numpy as np
+
+import config
+from app.CsrGraph import CsrGraph
+from app.HeuristicCache import FingerprintCache, graph_fingerprint
+
+
+class Landmarks:
+    """
+    Landmark (ALT) distance tables of one graph. A few landmark nodes are chosen once per graph and the shortest path
+    lengths between every node and every landmark are stored as (nodes, landmarks) float arrays. By the triangle
+    inequality d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L) for every landmark L, so the largest of
+    these differences is an admissible and consistent lower bound on the distance between any two nodes, computed in
+    O(#landmarks) without searching the graph.
+
+    >>> import networkx as nx
+    >>> landmarks = Landmarks.from_networkx(nx.path_graph(5), count=2)
+    >>> sorted(landmarks.labels[landmarks.landmarks].tolist())
+    [0, 4]
+    >>> heuristic = landmarks.heuristic(4)
+    >>> [heuristic(node) for node in range(5)]
+    [4.0, 3.0, 2.0, 1.0, 0.0]
+    """
+
+    def __init__(self, csr_f, csr_b, count):
+        """
+        :param csr_f: The CsrGraph of the graph.
+        :param csr_b: The CsrGraph with every edge reversed (csr_f itself for undirected graphs).
+        :param count: The number of landmarks. Fewer are used on graphs with fewer nodes.
+        """
+        self.csr = csr_f
+        self.labels = csr_f.labels
+        n = len(self.labels)
+        count = min(count, n)
+        self.landmarks = np.zeros(count, dtype=np.int64)
+        self.from_landmark = np.empty((n, count))
+        self.to_landmark = self.from_landmark if csr_b is csr_f else np.empty((n, count))
+        # Farthest point selection: each new landmark is the node farthest from the landmarks chosen so far, which
+        # spreads them over the periphery of the graph. Nodes no landmark reaches yet come first, so that every
+        # connected component gets a landmark.
+        nearest = np.full(n, np.inf)
+        candidate = 0
+        if n:
+            first = csr_f.shortest_path_lengths(int(self.labels[0]))
+            candidate = int(np.argmax(np.where(np.isinf(first), -1.0, first)))
+        for idx in range(count):
+            label = int(self.labels[candidate])
+            self.landmarks[idx] = candidate
+            self.from_landmark[:, idx] = csr_f.shortest_path_lengths(label)
+            if self.to_landmark is not self.from_landmark:
+                self.to_landmark[:, idx] = csr_b.shortest_path_lengths(label)
+            nearest = np.minimum(nearest, self.from_landmark[:, idx])
+            nearest[self.landmarks[:idx + 1]] = -1.0
+            candidate = int(np.argmax(nearest))
+
+    @classmethod
+    def from_networkx(cls, G, count=None):
+        """
+        :param G: The networkx graph, with integer nodes.
+        :param count: The number of landmarks (defaults to Config.LANDMARK_COUNT).
+        """
+        csr_f = CsrGraph.from_networkx(G)
+        csr_b = csr_f.reverse() if G.is_directed() else csr_f
+        return cls(csr_f, csr_b, config.Config.LANDMARK_COUNT if count is None else count)
+
+    @property
+    def nbytes(self):
+        size = self.from_landmark.nbytes + self.landmarks.nbytes
+        if self.to_landmark is not self.from_landmark:
+            size += self.to_landmark.nbytes
+        return size
+
+    def heuristic(self, target, forward=True):
+        """
+        Return a function giving the lower bound on the distance between a node and target.
+
+        :param target: The node label the distances are estimated to (forward) or from (backward).
+        :param forward: True to estimate d(node, target), False to estimate d(target, node).
+        """
+        index_of = self.csr.index_of
+        target_idx = index_of(int(target))
+        # Forward: d(v, t) >= d(v, L) - d(t, L) and d(v, t) >= d(L, t) - d(L, v); backward the roles are swapped.
+        # Missing distances never raise the bound: inf - inf is nan, which np.fmax ignores.
+        first, second = (self.to_landmark, self.from_landmark) if forward else (self.from_landmark, self.to_landmark)
+        first_target, second_target = first[target_idx], second[target_idx]
+
+        def estimate(node):
+            try:
+                idx = index_of(node)
+            except KeyError:
+                return float('inf')
+            with np.errstate(invalid='ignore'):
+                bound = np.fmax(first[idx] - first_target, second_target - second[idx]).max()
+            return float(bound) if bound > 0 else 0.0
+
+        return estimate
+
+
+class LandmarkCache(FingerprintCache):
+    """
+    LRU cache of the Landmarks of each graph, keyed by graph fingerprint, so the landmark searches run once per graph
+    however many start/goal pairs are queried on it.
+
+    >>> import networkx as nx
+    >>> cache = LandmarkCache(max_bytes=1024 * 1024)
+    >>> cache.get(nx.path_graph(3)) is cache.get(nx.path_graph(3))
+    True
+    >>> cache.hits, cache.misses
+    (1, 1)
+    """
+
+    def __init__(self, max_bytes):
+        """
+        :param max_bytes: Approximate memory cap for all cached distance tables.
+        """
+        super().__init__(max_bytes, lambda landmarks: landmarks.nbytes)
+
+    def get(self, G, fingerprint=None, csr=None):
+        """
+        Return the Landmarks of G, choosing them and computing their distances on a miss.
+
+        :param G: The networkx graph.
+        :param fingerprint: The graph fingerprint, if the caller has already computed it.
+        :param csr: The (forward, backward) CsrGraphs of G, if the caller has already built them.
+        """
+        if fingerprint is None:
+            fingerprint = graph_fingerprint(G)
+        if csr is None:
+            return self.fetch(fingerprint, lambda: Landmarks.from_networkx(G))
+        return self.fetch(fingerprint, lambda: Landmarks(*csr, config.Config.LANDMARK_COUNT))
+
+
+landmark_cache = LandmarkCache(config.Config.LANDMARK_CACHE_MAX_BYTES)
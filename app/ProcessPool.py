@@ -0,0 +1,60 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class ProcessPool:
+    """
+    A process pool created on first use and shared by every request of one kind of work. Workers are started with
+    forkserver (or spawn where it is not available) rather than fork, since the pool is first used from a request
+    thread of the threaded server and forking a multi-threaded process only copies the calling thread.
+
+    >>> pool = ProcessPool()
+    >>> pool.run(2, divmod, [(7, 2), (9, 4)])
+    [(3, 1), (2, 1)]
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.processes = 0
+        self.lock = threading.Lock()
+
+    def get_executor(self, processes):
+        """
+        Return an executor with at least the given number of workers. A smaller one is replaced, but not shut down:
+        other requests may still be submitting to it, and its workers exit once it is garbage collected.
+        """
+        with self.lock:
+            if self.executor is not None and self.processes < processes:
+                self.executor = None
+            if self.executor is None:
+                method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self.executor = ProcessPoolExecutor(max_workers=processes,
+                                                    mp_context=multiprocessing.get_context(method))
+                self.processes = processes
+            return self.executor
+
+    def run(self, processes, function, chunks):
+        """
+        Run function(*args) for every args tuple of chunks in the pool and return the results in order. A worker
+        dying (e.g. killed for running out of memory) breaks the whole pool, so a broken pool is replaced by a new one
+        and the chunks are submitted once more before giving up.
+
+        :param processes: Number of workers needed.
+        :param function: A module-level function, so that it can be pickled.
+        :param chunks: List of argument tuples.
+        :raises BrokenProcessPool: if the new pool breaks as well.
+        """
+        for attempt in range(2):
+            executor = self.get_executor(processes)
+            try:
+                futures = [executor.submit(function, *args) for args in chunks]
+                return [future.result() for future in futures]
+            except BrokenProcessPool:
+                with self.lock:
+                    if self.executor is executor:
+                        self.executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+                if attempt:
+                    raise
@@ -1,26 +1,45 @@
-import base64
-import pickle
+import copy
+import json
 import random
-from flask import render_template, request, current_app as app, session, jsonify, flash
+import time
+import config
+from flask import render_template, request, current_app as app, session, jsonify, flash, Response, stream_with_context
 import matplotlib
+from app.AnimationCache import animation_cache, animation_key
+from app.BatchQuery import batch_query, graph_from_edges
+from app.CsrGraph import csr_cache
+from app.FrontierTree import FrontierTree
 from app.GraphProblem import GraphProblem
+from app.GraphRenderer import FrameEncoder, GraphRenderer, capture_frame, frame_deltas, graph_layout, render_frames
+from app.GraphLayout import layout_cache
+from app.GraphStore import graph_store
+from app.HeuristicCache import heuristic_cache
+from app.LandmarkHeuristic import landmark_cache
 from app.GraphVis import GraphVisualization
-from py_search.base import Node
+from py_search.base import AnnotatedProblem, Node, format_action
 from py_search.informed import near_optimal_front_to_end_bidirectional_search
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 
 
+def load_graph_vis():
+    """
+    Load the GraphVisualization of the session from the graph store, or None if there is none or it has expired.
+    """
+    if 'graph_id' not in session:
+        return None
+    return graph_store.get(session['graph_id'])
+
+
 @app.route('/', methods=['GET', 'POST'])
 def index():
-    # Retrieve or create a new GraphVisualization object
-    if 'graph_vis' not in session:
+    # Retrieve or create a new GraphVisualization object. Stored graphs may be shared with other requests, so the
+    # stored object is never modified in place.
+    graph_vis = load_graph_vis()
+    if graph_vis is None:
         graph_vis = GraphVisualization()
     else:
-        try:
-            graph_vis = pickle.loads(base64.b64decode(session['graph_vis']))
-        except:
-            graph_vis = GraphVisualization()  # If there's an error, create a new object
+        graph_vis = copy.copy(graph_vis)
 
     if request.method == 'POST':
         node1_list = request.form.getlist('node1[]')
@@ -36,79 +55,259 @@ def index():
 
     else:  # GET request, generate a random graph
         num_nodes = request.args.get('num_nodes', random.randint(10, 20), int)
-        if num_nodes < 2 or num_nodes > 40:
+        max_nodes = config.Config.RANDOM_GRAPH_MAX_NODES
+        if num_nodes < 2 or num_nodes > max_nodes:
             # Handle case where num_nodes is outside the valid range
-            return {'error': f'Number of nodes must be between 2 and 40, received: {num_nodes}'}
+            return {'error': f'Number of nodes must be between 2 and {max_nodes}, received: {num_nodes}'}
         graph_vis.generate_random_graph(num_nodes - 1)
 
     graph_img = graph_vis.get_graph_image()
     plt.close()
 
-    # Store the updated graph_vis object in the session
-    session['graph_vis'] = base64.b64encode(pickle.dumps(graph_vis)).decode('utf-8')
+    # Store the updated graph_vis object server-side, the session only keeps its id
+    session['graph_id'] = graph_store.put(graph_vis, session.get('graph_id'))
 
     return render_template('index.html', graph_img=graph_img, edges=graph_vis.edges, start_node=graph_vis.start_node,
                            goal_node=graph_vis.goal_node)
 
 
+def structure_messages(lines):
+    return [{'text': line[1:] if line.startswith("`") else line, 'is_title': line.startswith("`")} for line in lines]
+
+
+def search_frames(problem, fronted_tree, backed_tree):
+    """
+    Run the search, growing the two FrontierTrees, and yield (Frame, structured messages) for every image of the
+    demonstration as soon as the search produces it. The messages are the search trace that led to the frame. A frame
+    in which neither tree changed (e.g. a state expanded again at a lower cost) is not yielded; its messages go with
+    the next frame. The last frame carries the path edges; if no route is found no such frame is yielded.
+    """
+    messages = []
+    previous = None
+    for idx, node in enumerate(near_optimal_front_to_end_bidirectional_search(problem)):
+        if isinstance(node, list):
+            messages.extend(structure_messages(node))
+
+        elif isinstance(node, Node):
+            if idx % 3 == 1:
+                fronted_tree.add(node)
+            elif idx % 3 == 2:
+                backed_tree.add(node)
+                frame = capture_frame(fronted_tree, backed_tree)
+                if frame != previous:
+                    yield frame, messages
+                    messages, previous = [], frame
+
+        else:
+            path_edges = node.path()
+            fronted_tree.add(node.state_node)
+            backed_tree.add(node.goal_node)
+            frame = capture_frame(fronted_tree, backed_tree)
+            if frame != previous:
+                yield frame, messages
+                messages = []
+            path_message = f"path edges: {tuple(format_action(edge) for edge in path_edges)}"
+            messages.append({'text': path_message, 'is_title': True})
+            yield capture_frame(fronted_tree, backed_tree, path_edges), messages
+            return
+
+
+def frame_encoding():
+    """
+    The encoding of the rendered frames asked for by the encoding query parameter: 'png' (the default, one whole PNG
+    per frame, under "photos") or 'delta' (keyframes and patches against them, see FrameEncoder, under "frames").
+    Returns None for anything else.
+    """
+    encoding = request.args.get('encoding', 'png')
+    return encoding if encoding in ('png', 'delta') else None
+
+
+def search_stats(problem, setup_start, search_start, render_start, end):
+    """
+    Combine the counters of the AnnotatedProblem with the wall clock time of each stage of a request, and log them,
+    to tell whether a slow request is bound by the problem setup (the heuristics), the search or the rendering.
+    """
+    stats = problem.stats()
+    stats.update(setup_seconds=search_start - setup_start, search_seconds=render_start - search_start,
+                 render_seconds=end - render_start)
+    app.logger.info("Search stats: %s", stats)
+    return stats
+
+
 @app.route('/generate_photos', methods=['POST'])
 def generate_photos():
-    global fronted_graph, backed_graph
-    if 'graph_vis' not in session:
+    if 'graph_id' not in session:
         return {'error': 'No graph found'}, 400
 
-    try:
-        graph_vis = pickle.loads(base64.b64decode(session['graph_vis']))
-    except:
+    graph_vis = load_graph_vis()
+    if graph_vis is None:
         return {'error': 'Invalid graph data'}, 400
+    encoding = frame_encoding()
+    if encoding is None:
+        return {'error': 'Unknown frame encoding'}, 400
+
+    # Identical demonstrations are served from the animation cache without searching or rendering again. The stream
+    # route only reads these entries, so their body is always the one built here
+    key = animation_key(graph_vis, mode='photos', encoding=encoding)
+    cached = animation_cache.get(key)
+    if cached is not None:
+        return Response(cached, mimetype='application/json')
 
-    new_photos = []
     structured_messages = []  # List to store structured messages
-    fronted_vertices = []
-    backed_vertices = []
+    fronted_tree = FrontierTree()
+    backed_tree = FrontierTree()
+    frames = []  # Frame descriptions, rendered once the search is over
 
-    problem = GraphProblem(graph_vis)
-    path_edges = None
+    setup_start = time.perf_counter()
+    problem = AnnotatedProblem(GraphProblem(graph_vis))
+    search_start = time.perf_counter()
+    for frame, messages in search_frames(problem, fronted_tree, backed_tree):
+        frames.append(frame)
+        structured_messages.append(messages)
 
-    for idx, node in enumerate(near_optimal_front_to_end_bidirectional_search(problem)):
-        if isinstance(node, list):
-            structured_message = [{'text': line[1:] if line.startswith("`") else line, 'is_title': line.startswith("`")}
-                                  for idx, line in enumerate(node)]
-            structured_messages.append(structured_message)
+    if not frames or frames[-1].path_edges is None:
+        return {'error': 'No route was found'}, 400
+    render_start = time.perf_counter()
+    new_photos = render_frames(graph_vis, fronted_tree, backed_tree, frames, encoding=encoding)
+    stats = search_stats(problem, setup_start, search_start, render_start, time.perf_counter())
 
-        elif isinstance(node, Node):
-            if idx % 3 == 1:
-                fronted_vertices.append(node)
-            elif idx % 3 == 2:
-                backed_vertices.append(node)
+    field = 'photos' if encoding == 'png' else 'frames'
+    data = json.dumps({field: new_photos, 'messages': structured_messages, 'stats': stats}).encode()
+    animation_cache.put(key, data)
+    return Response(data, mimetype='application/json')
 
-            fronted_graph = graph_vis.filter_graph(fronted_vertices)
-            backed_graph = graph_vis.filter_graph(backed_vertices)
-            combined_image = graph_vis.generate_combined_graph_image(fronted_graph, backed_graph)
-            if idx % 3 == 2:
-                new_photos.append(combined_image)
 
-        else:
-            path_edges = node.path()
-            fronted_vertices.append(node.state_node)
-            backed_vertices.append(node.goal_node)
-            fronted_graph = graph_vis.filter_graph(fronted_vertices)
-            backed_graph = graph_vis.filter_graph(backed_vertices)
-            combined_image = graph_vis.generate_combined_graph_image(fronted_graph, backed_graph)
-            new_photos.append(combined_image)
-            break
-
-    if path_edges:
-        final_image = graph_vis.generate_combined_graph_image(fronted_graph, backed_graph, path_edges)
-        new_photos.append(final_image)
-        print(path_edges)
-        structured_messages.append([{'text': f"path edges: {path_edges}", 'is_title': True}])
-    else:
+@app.route('/generate_photos/deltas', methods=['POST'])
+def generate_deltas():
+    """
+    Client-side rendering variant of generate_photos. Instead of one PNG per frame, responds with the layout of the
+    graph once and, per frame, only the nodes and edges that joined each search tree, for the browser to draw.
+    """
+    if 'graph_id' not in session:
+        return {'error': 'No graph found'}, 400
+
+    graph_vis = load_graph_vis()
+    if graph_vis is None:
+        return {'error': 'Invalid graph data'}, 400
+
+    key = animation_key(graph_vis, mode='deltas')
+    cached = animation_cache.get(key)
+    if cached is not None:
+        return Response(cached, mimetype='application/json')
+
+    structured_messages = []
+    fronted_tree = FrontierTree()
+    backed_tree = FrontierTree()
+    frames = []
+
+    setup_start = time.perf_counter()
+    problem = AnnotatedProblem(GraphProblem(graph_vis))
+    search_start = time.perf_counter()
+    for frame, messages in search_frames(problem, fronted_tree, backed_tree):
+        frames.append(frame)
+        structured_messages.append(messages)
+
+    if not frames or frames[-1].path_edges is None:
         return {'error': 'No route was found'}, 400
+    render_start = time.perf_counter()
+    layout, deltas = graph_layout(graph_vis), frame_deltas(fronted_tree, backed_tree, frames)
+    stats = search_stats(problem, setup_start, search_start, render_start, time.perf_counter())
+
+    data = json.dumps({'layout': layout, 'messages': structured_messages, 'frames': deltas, 'stats': stats}).encode()
+    animation_cache.put(key, data)
+    return Response(data, mimetype='application/json')
+
+
+@app.route('/generate_photos/stream', methods=['POST'])
+def stream_photos():
+    """
+    Streaming variant of generate_photos. Responds with newline delimited JSON, one {"photo", "messages"} object per
+    frame ({"frame", "messages"} in the 'delta' encoding), rendered and sent as soon as the search produces it, or a
+    single {"error"} object if no route is found. Only the frame being sent is held in memory, so streamed
+    demonstrations are not added to the animation cache; one that generate_photos already cached is replayed from it,
+    and the stats of the cached body are left out.
+    """
+    if 'graph_id' not in session:
+        return {'error': 'No graph found'}, 400
+
+    graph_vis = load_graph_vis()
+    if graph_vis is None:
+        return {'error': 'Invalid graph data'}, 400
+    encoding = frame_encoding()
+    if encoding is None:
+        return {'error': 'Unknown frame encoding'}, 400
+
+    key = animation_key(graph_vis, mode='photos', encoding=encoding)
+    cached = animation_cache.get(key)
+    field, line_field = ('photos', 'photo') if encoding == 'png' else ('frames', 'frame')
+
+    def replay():
+        result = json.loads(cached)
+        for photo, messages in zip(result[field], result['messages']):
+            yield json.dumps({line_field: photo, 'messages': messages}) + '\n'
+
+    def generate():
+        fronted_tree = FrontierTree()
+        backed_tree = FrontierTree()
+        renderer = GraphRenderer(graph_vis)
+        encoder = FrameEncoder(config.Config.KEYFRAME_INTERVAL)
+        found = False
+        for frame, messages in search_frames(GraphProblem(graph_vis), fronted_tree, backed_tree):
+            trees = (fronted_tree.node_order, fronted_tree.edge_order, backed_tree.node_order, backed_tree.edge_order)
+            if encoding == 'png':
+                photo = renderer.render_frame(*trees, frame.path_edges)
+            else:
+                photo = encoder.encode(renderer.render_pixels(*trees, frame.path_edges))
+            found = frame.path_edges is not None
+            yield json.dumps({line_field: photo, 'messages': messages}) + '\n'
+        if not found:
+            yield json.dumps({'error': 'No route was found'}) + '\n'
+
+    if cached is not None:
+        return Response(replay(), mimetype='application/x-ndjson')
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/batch_query', methods=['POST'])
+def batch_query_route():
+    """
+    Headless queries: takes a JSON object with "pairs", a list of [start, goal] pairs, and optionally "edges", a list
+    of [u, v, weight] edges (the session graph is used without it). Responds with the cost, path and number of
+    expanded nodes of every query, without rendering anything.
+    """
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get('pairs'), list):
+        return {'error': 'Expected a JSON object with a list of pairs'}, 400
+
+    try:
+        if 'edges' in body:
+            graph_vis = graph_from_edges(body['edges'])
+        else:
+            graph_vis = load_graph_vis()
+            if graph_vis is None:
+                return {'error': 'No graph found'}, 400
+        results = batch_query(graph_vis, body['pairs'])
+    except (TypeError, ValueError) as e:
+        return {'error': str(e)}, 400
+
+    return {'results': [result._asdict() for result in results]}
 
-    session['graph_vis'] = base64.b64encode(pickle.dumps(graph_vis)).decode('utf-8')
 
-    return {'photos': new_photos, 'messages': structured_messages}
+@app.route('/cache_stats')
+def cache_stats():
+    """
+    Hit and miss counters of the caches of this server process.
+    """
+    return {'animations': animation_cache.stats(),
+            'csr': {'hits': csr_cache.hits, 'misses': csr_cache.misses,
+                    'graphs': len(csr_cache), 'bytes': csr_cache.size},
+            'heuristics': {'hits': heuristic_cache.hits, 'misses': heuristic_cache.misses,
+                           'tables': len(heuristic_cache), 'bytes': heuristic_cache.size},
+            'landmarks': {'hits': landmark_cache.hits, 'misses': landmark_cache.misses,
+                          'graphs': len(landmark_cache), 'bytes': landmark_cache.size},
+            'layouts': {'hits': layout_cache.hits, 'misses': layout_cache.misses,
+                        'layouts': len(layout_cache), 'bytes': layout_cache.size}}
 
 
 @app.route('/error')
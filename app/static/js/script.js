@@ -47,56 +47,235 @@ function generateRandomGraph() {
     window.location.href = url;
 }
 
-document.getElementById('generate-demo-btn').addEventListener('click', function() {
-    fetch('/generate_photos', {
+function appendFrame(photosContainer, photo, messages) {
+    const img = document.createElement('img');
+    img.src = 'data:image/png;base64,' + photo;
+    img.alt = 'Generated Photo';
+    img.className = 'photo';
+    appendFrameElement(photosContainer, img, messages);
+}
+
+function appendFrameElement(photosContainer, element, messages) {
+    const frameWrapper = document.createElement('div');
+    frameWrapper.className = 'photo-frame';
+
+    frameWrapper.appendChild(element);
+
+    if (messages && messages.length) {
+        const messageDiv = document.createElement('div');
+        messageDiv.className = 'message';
+
+        messages.forEach(line => {
+            const lineElem = document.createElement('div');
+            if (line.is_title) {
+                lineElem.className = 'title';
+                lineElem.innerText = line.text;
+            } else {
+                lineElem.innerText = line.text;
+            }
+            messageDiv.appendChild(lineElem);
+        });
+
+        frameWrapper.appendChild(messageDiv);
+    }
+
+    photosContainer.appendChild(frameWrapper);
+}
+
+function loadImage(photo) {
+    return new Promise((resolve, reject) => {
+        const img = new Image();
+        img.onload = () => resolve(img);
+        img.onerror = reject;
+        img.src = 'data:image/png;base64,' + photo;
+    });
+}
+
+// In the delta encoding a frame is either a whole keyframe or a patch of the pixels that changed since the frame
+// before it (its base), which is drawn over the base frame at (x, y). decoded maps the index of every frame to a
+// promise of its image.
+function appendDeltaFrame(photosContainer, frame, messages, decoded, index) {
+    if (frame.photo) {
+        decoded.set(index, loadImage(frame.photo));
+        appendFrame(photosContainer, frame.photo, messages);
+        return;
+    }
+    const canvas = document.createElement('canvas');
+    canvas.className = 'photo';
+    appendFrameElement(photosContainer, canvas, messages);
+    decoded.set(index, Promise.all([decoded.get(frame.base), frame.patch && loadImage(frame.patch)])
+        .then(([base, patch]) => {
+            canvas.width = base.width;
+            canvas.height = base.height;
+            const context = canvas.getContext('2d');
+            context.drawImage(base, 0, 0);
+            if (patch) {
+                context.drawImage(patch, frame.x, frame.y);
+            }
+            return canvas;
+        }));
+    decoded.get(index).catch(error => console.error('Error:', error));
+}
+
+function showErrorModal() {
+    const modal = document.getElementById('errorModal');
+    modal.style.display = "block";
+}
+
+// Frames arrive as newline delimited JSON, delta encoded, and are appended as soon as each line is complete
+async function streamDemo() {
+    const photosContainer = document.getElementById('new-demo-container');
+    photosContainer.innerHTML = '';  // Clear previous photos
+
+    const response = await fetch('/generate_photos/stream?encoding=delta', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
         },
-    })
-    .then(response => response.json())
-    .then(data => {
-        if (data.error) {
-            const modal = document.getElementById('errorModal');
-            modal.style.display = "block";
-        } else {
-            const photosContainer = document.getElementById('new-demo-container');
-            photosContainer.innerHTML = '';  // Clear previous photos
-
-            data.photos.forEach((photo, index) => {
-                const frameWrapper = document.createElement('div');
-                frameWrapper.className = 'photo-frame';
-
-                const img = document.createElement('img');
-                img.src = 'data:image/png;base64,' + photo;
-                img.alt = 'Generated Photo';
-                img.className = 'photo';
-
-                frameWrapper.appendChild(img);
-
-                if (data.messages && data.messages[index] && data.messages[index].length) {
-                    const messageDiv = document.createElement('div');
-                    messageDiv.className = 'message';
-
-                    data.messages[index].forEach(line => {
-                        const lineElem = document.createElement('div');
-                        if (line.is_title) {
-                            lineElem.className = 'title';
-                            lineElem.innerText = line.text;
-                        } else {
-                            lineElem.innerText = line.text;
-                        }
-                        messageDiv.appendChild(lineElem);
-                    });
-
-                    frameWrapper.appendChild(messageDiv);
-                }
-
-                photosContainer.appendChild(frameWrapper);
-            });
+    });
+    if (!response.ok) {
+        showErrorModal();
+        return;
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const decoded = new Map();
+    let frameIndex = 0;
+    let buffer = '';
+    while (true) {
+        const {done, value} = await reader.read();
+        if (done) {
+            break;
         }
-    })
-    .catch(error => console.error('Error:', error));
+        buffer += decoder.decode(value, {stream: true});
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => {
+            const data = JSON.parse(line);
+            if (data.error) {
+                showErrorModal();
+            } else if (data.frame) {
+                appendDeltaFrame(photosContainer, data.frame, data.messages, decoded, frameIndex++);
+            } else {
+                appendFrame(photosContainer, data.photo, data.messages);
+            }
+        });
+    }
+}
+
+const SVG_NS = 'http://www.w3.org/2000/svg';
+const FRAME_SIZE = 400;
+
+function svgElement(name, attributes, text) {
+    const element = document.createElementNS(SVG_NS, name);
+    Object.entries(attributes).forEach(([key, value]) => element.setAttribute(key, value));
+    if (text !== undefined) {
+        element.textContent = text;
+    }
+    return element;
+}
+
+// Map the layout of the graph to pixel positions inside a frame, with y pointing down
+function prepareLayout(layout) {
+    const xs = layout.nodes.map(node => node[1]);
+    const ys = layout.nodes.map(node => node[2]);
+    const minX = Math.min(...xs), maxX = Math.max(...xs), minY = Math.min(...ys), maxY = Math.max(...ys);
+    const scale = (FRAME_SIZE * 0.8) / Math.max(maxX - minX, maxY - minY, 1e-9);
+    const offsetX = (FRAME_SIZE - (maxX - minX) * scale) / 2;
+    const offsetY = (FRAME_SIZE * 0.85 - (maxY - minY) * scale) / 2;
+    const xy = new Map(layout.nodes.map(([node, x, y]) => [node, [offsetX + (x - minX) * scale,
+                                                                  offsetY + (maxY - y) * scale]]));
+    const weights = new Map();
+    layout.edges.forEach(([u, v, weight]) => {
+        weights.set(u + ',' + v, weight);
+        weights.set(v + ',' + u, weight);
+    });
+    return {xy: xy, edges: layout.edges, weights: weights};
+}
+
+// Draw one frame from the nodes and edges both search trees have reached so far, in the colors of the server
+// rendered frames: the forward tree in green, the backward tree in red and the final path in light green
+function drawFrame(graph, front, back, path) {
+    const final = path !== null;
+    const pathSet = new Set();
+    (path || []).forEach(([u, v]) => {
+        pathSet.add(u + ',' + v);
+        pathSet.add(v + ',' + u);
+    });
+    const svg = svgElement('svg', {viewBox: `0 0 ${FRAME_SIZE} ${FRAME_SIZE}`, class: 'photo'});
+
+    graph.edges.forEach(([u, v]) => {
+        const [x1, y1] = graph.xy.get(u), [x2, y2] = graph.xy.get(v);
+        svg.appendChild(svgElement('line', {x1: x1, y1: y1, x2: x2, y2: y2, stroke: '#eeeeee'}));
+    });
+    graph.xy.forEach(([x, y]) => svg.appendChild(svgElement('circle', {cx: x, cy: y, r: 4, fill: '#eeeeee'})));
+
+    [...front.edges, ...back.edges].forEach(([u, v]) => {
+        const [x1, y1] = graph.xy.get(u), [x2, y2] = graph.xy.get(v);
+        const color = final ? (pathSet.has(u + ',' + v) ? 'lightgreen' : 'grey') : 'black';
+        svg.appendChild(svgElement('line', {x1: x1, y1: y1, x2: x2, y2: y2, stroke: color,
+                                            'stroke-width': final ? 2 : 1}));
+        svg.appendChild(svgElement('text', {x: (x1 + x2) / 2, y: (y1 + y2) / 2, class: 'edge-label'},
+                                   Math.round(graph.weights.get(u + ',' + v))));
+    });
+    front.nodes.forEach(node => {
+        const [x, y] = graph.xy.get(node);
+        svg.appendChild(svgElement('circle', {cx: x, cy: y, r: 10, fill: 'green'}));
+    });
+    back.nodes.forEach(node => {
+        const [x, y] = graph.xy.get(node);
+        svg.appendChild(svgElement('circle', {cx: x, cy: y, r: final ? 7 : 10, fill: 'red'}));
+    });
+    new Set([...front.nodes, ...back.nodes]).forEach(node => {
+        const [x, y] = graph.xy.get(node);
+        const color = final || !back.nodes.has(node) ? 'white' : 'black';
+        svg.appendChild(svgElement('text', {x: x, y: y, fill: color, class: 'node-label',
+                                            'font-size': final ? 7 : 11}, node));
+    });
+
+    if (final) {
+        const totalCost = path.reduce((total, [u, v]) => total + graph.weights.get(u + ',' + v), 0);
+        [`Total Cost: ${totalCost}`, `Total Front Nodes: ${front.nodes.size}`,
+         `Total Back Nodes: ${back.nodes.size}`].forEach((line, i) => {
+            svg.appendChild(svgElement('text', {x: 40, y: FRAME_SIZE * 0.9 + 14 * i, class: 'annotation'}, line));
+        });
+    }
+    return svg;
+}
+
+// Frames arrive as the layout of the graph plus what changed in each frame, and are drawn in the browser
+async function deltaDemo() {
+    const photosContainer = document.getElementById('new-demo-container');
+    photosContainer.innerHTML = '';  // Clear previous photos
+
+    const response = await fetch('/generate_photos/deltas', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+    });
+    if (!response.ok) {
+        showErrorModal();
+        return;
+    }
+
+    const data = await response.json();
+    const graph = prepareLayout(data.layout);
+    const front = {nodes: new Set(), edges: []};
+    const back = {nodes: new Set(), edges: []};
+    data.frames.forEach((frame, i) => {
+        frame.front_nodes.forEach(node => front.nodes.add(node));
+        front.edges.push(...frame.front_edges);
+        frame.back_nodes.forEach(node => back.nodes.add(node));
+        back.edges.push(...frame.back_edges);
+        appendFrameElement(photosContainer, drawFrame(graph, front, back, frame.path), data.messages[i]);
+    });
+}
+
+document.getElementById('generate-demo-btn').addEventListener('click', function() {
+    const demo = document.getElementById('client-render').checked ? deltaDemo : streamDemo;
+    demo().catch(error => console.error('Error:', error));
 });
 
 
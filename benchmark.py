@@ -0,0 +1,238 @@
+"""
+Benchmark suite for the NBS search, its data structures and the frame rendering.
+
+Generates seeded graphs of several kinds and scales, times each part separately and writes the results as JSON, so
+that runs on different commits can be compared::
+
+    python benchmark.py --scales 100 1000 10000 --output bench.json
+
+Every timing is the best of --repeats runs, in seconds.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.BatchQuery import graph_from_edges
+from app.CsrGraph import csr_cache
+from app.FrontierTree import FrontierTree
+from app.GraphProblem import GraphProblem
+from app.GraphRenderer import GraphRenderer, capture_frame
+from app.HeuristicCache import heuristic_cache
+from app.LandmarkHeuristic import landmark_cache
+from py_search.base import NbsDataStructure, Node, PriorityQueue, SolutionNode, TRACE_FULL, TRACE_OFF
+from py_search.informed import near_optimal_front_to_end_bidirectional_search
+
+GRAPH_KINDS = ('grid', 'sparse', 'dense', 'scale_free')
+
+
+def generate_edges(kind, n, rng):
+    """
+    Generate the (u, v, weight) edges of a connected graph with about n nodes and integer weights from 1 to 9.
+
+    :param kind: 'grid' (a square grid), 'sparse' (random, average degree 4), 'dense' (random, average degree 20) or
+        'scale_free' (Barabasi-Albert with 2 edges per new node).
+    :param n: The number of nodes.
+    :param rng: numpy Generator.
+    """
+    if kind == 'grid':
+        side = max(int(round(n ** 0.5)), 2)
+        ids = np.arange(side * side).reshape(side, side)
+        sources = np.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+        targets = np.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    elif kind in ('sparse', 'dense'):
+        degree = 4 if kind == 'sparse' else 20
+        # A random spanning path keeps the graph connected, the other edges are uniform
+        order = rng.permutation(n)
+        extra = max(n * degree // 2 - (n - 1), 0)
+        sources = np.concatenate([order[:-1], rng.integers(0, n, extra)])
+        targets = np.concatenate([order[1:], rng.integers(0, n, extra)])
+    elif kind == 'scale_free':
+        # Preferential attachment: new nodes link to endpoints of earlier edges
+        sources, targets = [1], [0]
+        endpoints = [0, 1]
+        for node in range(2, n):
+            for _ in range(2):
+                sources.append(node)
+                targets.append(endpoints[int(rng.integers(len(endpoints)))])
+            endpoints.extend([node, targets[-1], node, targets[-2]])
+        sources, targets = np.array(sources), np.array(targets)
+    else:
+        raise ValueError(f"Unknown graph kind: {kind}")
+
+    keep = sources != targets
+    sources, targets = sources[keep], targets[keep]
+    weights = rng.integers(1, 10, len(sources)).astype(float)
+    return list(zip(sources.tolist(), targets.tolist(), weights.tolist()))
+
+
+def best_time(function, repeats):
+    """
+    Return the best wall clock time of repeats calls, and the result of the last call.
+    """
+    best, result = float('inf'), None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run_search(problem, trace):
+    """
+    Run NBS to the first solution, returning the expanded nodes and the solution.
+    """
+    expanded = []
+    for node in near_optimal_front_to_end_bidirectional_search(problem, trace=trace):
+        if isinstance(node, SolutionNode):
+            return expanded, node
+        if isinstance(node, Node):
+            expanded.append(node)
+    return expanded, None
+
+
+def bench_priority_queue(n, rng, repeats):
+    values = rng.random(n).tolist()
+
+    def push_pop():
+        pq = PriorityQueue(node_value=lambda x: x)
+        for value in values:
+            pq.push(value)
+        while len(pq):
+            pq.pop()
+
+    seconds, _ = best_time(push_pop, repeats)
+    return {'seconds': seconds, 'operations': 2 * n}
+
+
+def bench_prepare_best(n, rng, repeats):
+    costs = rng.integers(0, 100, (2, n)).tolist()
+    heuristics = rng.integers(0, 100, (2, n)).tolist()
+
+    def drain():
+        fringes = []
+        for costs_, heuristics_ in zip(costs, heuristics):
+            fringe = NbsDataStructure(node_value_waiting=lambda node, h=heuristics_: node.cost() + h[node.state],
+                                      node_value_ready=lambda node: node.cost(), trace=TRACE_OFF)
+            for state, cost in enumerate(costs_):
+                fringe.push(Node(state, node_cost=cost))
+            fringes.append(fringe)
+        forward, backward = fringes
+        calls = 0
+        while len(forward) and len(backward):
+            if not forward.prepare_best(backward)[0]:
+                break
+            forward.pop()
+            backward.pop()
+            calls += 1
+        return calls
+
+    seconds, calls = best_time(drain, repeats)
+    return {'seconds': seconds, 'calls': calls}
+
+
+def bench_graph(kind, n, rng, repeats, max_render_nodes, max_trace_nodes, frames):
+    """
+    Time every part of a demonstration on one generated graph.
+    """
+    graph_vis = graph_from_edges(generate_edges(kind, n, rng))
+    G = graph_vis.G
+    graph_vis.start_node, graph_vis.goal_node = graph_vis.find_farthest_pair()
+    results = {'graph': kind, 'nodes': G.number_of_nodes(), 'edges': G.number_of_edges()}
+
+    def setup():
+        heuristic_cache.clear()
+        landmark_cache.clear()
+        csr_cache.clear()
+        return GraphProblem(graph_vis)
+
+    results['problem_setup'], problem = best_time(setup, repeats)
+    results['nbs_search'], (expanded, solution) = best_time(lambda: run_search(problem, TRACE_OFF), repeats)
+    results['expansions'] = len(expanded)
+    results['solution_cost'] = None if solution is None else solution.cost()
+    if n <= max_trace_nodes:
+        results['nbs_search_full_trace'], _ = best_time(lambda: run_search(problem, TRACE_FULL), repeats)
+
+    results['filter_graph'], _ = best_time(lambda: graph_vis.filter_graph(expanded), repeats)
+
+    if n <= max_render_nodes and solution is not None:
+        positions = rng.random((G.number_of_nodes(), 2))
+        graph_vis.pos = {node: positions[idx] for idx, node in enumerate(G.nodes())}
+        fronted_tree, backed_tree = FrontierTree(), FrontierTree()
+        captured = []
+        step = max(len(expanded) // frames, 1)
+        for idx, node in enumerate(expanded):
+            (fronted_tree if idx % 2 == 0 else backed_tree).add(node)
+            if idx % step == step - 1:
+                captured.append(capture_frame(fronted_tree, backed_tree))
+        fronted_tree.add(solution.state_node)
+        backed_tree.add(solution.goal_node)
+        captured.append(capture_frame(fronted_tree, backed_tree, solution.path()))
+
+        results['renderer_setup'], renderer = best_time(lambda: GraphRenderer(graph_vis), repeats)
+
+        def render():
+            for frame in captured:
+                renderer.render_frame(fronted_tree.node_order[:frame.front_nodes],
+                                      fronted_tree.edge_order[:frame.front_edges],
+                                      backed_tree.node_order[:frame.back_nodes],
+                                      backed_tree.edge_order[:frame.back_edges], frame.path_edges)
+
+        seconds, _ = best_time(render, repeats)
+        results['render_frame'] = seconds / len(captured)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[100, 1000, 10000, 100000],
+                        help='Node counts of the generated graphs (up to 1000000).')
+    parser.add_argument('--kinds', nargs='+', choices=GRAPH_KINDS, default=list(GRAPH_KINDS))
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--frames', type=int, default=20, help='Frames rendered per graph.')
+    parser.add_argument('--max-render-nodes', type=int, default=1000,
+                        help='Largest graph whose frames are rendered.')
+    parser.add_argument('--max-trace-nodes', type=int, default=1000,
+                        help='Largest graph also searched with the full trace.')
+    parser.add_argument('--output', help='JSON file to write (defaults to stdout).')
+    args = parser.parse_args(argv)
+
+    report = {'commit': git_commit(), 'timestamp': datetime.now(timezone.utc).isoformat(),
+              'python': sys.version.split()[0], 'platform': platform.platform(), 'seed': args.seed,
+              'repeats': args.repeats, 'data_structures': [], 'graphs': []}
+    for n in args.scales:
+        rng = np.random.default_rng([args.seed, n])
+        random.seed(args.seed)
+        report['data_structures'].append({'size': n, 'priority_queue': bench_priority_queue(n, rng, args.repeats),
+                                          'prepare_best': bench_prepare_best(n, rng, args.repeats)})
+        for kind in args.kinds:
+            results = bench_graph(kind, n, rng, args.repeats, args.max_render_nodes, args.max_trace_nodes,
+                                  args.frames)
+            report['graphs'].append(results)
+            print(f"{kind} n={n}: search {results['nbs_search']:.4f}s, {results['expansions']} expansions",
+                  file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
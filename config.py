@@ -4,3 +4,38 @@ import os
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'default_secret_key')
     DEBUG = False
+    # Approximate memory cap of the shared heuristic table cache
+    HEURISTIC_CACHE_MAX_BYTES = int(os.environ.get('HEURISTIC_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    # Approximate memory cap of the cache of the CSR adjacency arrays searches expand graphs through
+    CSR_CACHE_MAX_BYTES = int(os.environ.get('CSR_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    # Search heuristic: 'rank' (ranked Dijkstra distances from each endpoint, computed per endpoint), 'landmarks'
+    # (ALT lower bounds from LANDMARK_COUNT landmarks chosen once per graph) or 'auto' (landmarks from
+    # LANDMARK_MIN_NODES nodes on), and the approximate memory cap of the cached landmark distance tables
+    HEURISTIC = os.environ.get('HEURISTIC', 'auto')
+    LANDMARK_COUNT = int(os.environ.get('LANDMARK_COUNT', 8))
+    LANDMARK_MIN_NODES = int(os.environ.get('LANDMARK_MIN_NODES', 2000))
+    LANDMARK_CACHE_MAX_BYTES = int(os.environ.get('LANDMARK_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+    # Number of processes rendering search frames in parallel (1 renders in the request thread)
+    RENDER_PROCESSES = int(os.environ.get('RENDER_PROCESSES', os.cpu_count() or 1))
+    # Number of processes solving the queries of a batch in parallel (1 solves them in the request thread)
+    BATCH_PROCESSES = int(os.environ.get('BATCH_PROCESSES', os.cpu_count() or 1))
+    # Server-side storage of the session graphs: 'memory' (in-process LRU) or 'sqlite' (GRAPH_STORE_PATH)
+    GRAPH_STORE = os.environ.get('GRAPH_STORE', 'memory')
+    GRAPH_STORE_PATH = os.environ.get('GRAPH_STORE_PATH', 'graphs.sqlite3')
+    # Seconds an unused graph is kept, and approximate cap for all stored graphs
+    GRAPH_STORE_TTL = int(os.environ.get('GRAPH_STORE_TTL', 24 * 60 * 60))
+    GRAPH_STORE_MAX_BYTES = int(os.environ.get('GRAPH_STORE_MAX_BYTES', 256 * 1024 * 1024))
+    # Frames from one keyframe to the next in the 'delta' encoding of the rendered frames
+    KEYFRAME_INTERVAL = int(os.environ.get('KEYFRAME_INTERVAL', 10))
+    # Approximate memory cap of the cache of graph layouts, and the graph size from which layouts are approximated
+    # instead of computed exactly by nx.spring_layout
+    LAYOUT_CACHE_MAX_BYTES = int(os.environ.get('LAYOUT_CACHE_MAX_BYTES', 16 * 1024 * 1024))
+    LAYOUT_APPROXIMATE_MIN_NODES = int(os.environ.get('LAYOUT_APPROXIMATE_MIN_NODES', 300))
+    # Largest random graph the index page generates. Layouts scale to thousands of nodes, but the page draws the graph
+    # with node and edge labels through matplotlib, which takes about 0.8s at 40 nodes, 5s at 300 and 46s at 3000
+    RANDOM_GRAPH_MAX_NODES = int(os.environ.get('RANDOM_GRAPH_MAX_NODES', 40))
+    # Approximate memory cap of the cache of generated demonstrations, and an optional directory the least recently
+    # used ones are spilled to (with its own cap)
+    ANIMATION_CACHE_MAX_BYTES = int(os.environ.get('ANIMATION_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    ANIMATION_CACHE_DIR = os.environ.get('ANIMATION_CACHE_DIR') or None
+    ANIMATION_CACHE_DISK_MAX_BYTES = int(os.environ.get('ANIMATION_CACHE_DISK_MAX_BYTES', 1024 * 1024 * 1024))
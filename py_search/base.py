@@ -9,10 +9,21 @@ used to represent a node in the search space.
 
 Finally, the module contains the :class:`Fringe` class, and its instantiations
 (:class:`FIFOQueue`, :class:`LIFOQueue`, and :class:`PrioritySet`). A Fringe is
-used to structure the way a search space is explored.
+used to structure the way a search space is explored. The closed lists of the
+searches (:class:`ClosedList` and :class:`DenseClosedList`) record the cheapest
+node found for every generated state.
 """
+from array import array
 from random import choice
-from bisect import insort
+from time import perf_counter
+from heapq import heapify
+from heapq import heappop
+from heapq import heappush
+
+TRACE_OFF = "off"
+TRACE_SUMMARY = "summary"
+TRACE_FULL = "full"
+TRACE_LEVELS = (TRACE_OFF, TRACE_SUMMARY, TRACE_FULL)
 
 
 class Problem(object):
@@ -75,6 +86,167 @@ class Problem(object):
             goal_node = self.goal
         return state_node == goal_node
 
+    def state_space_size(self):
+        """
+        Returns n when every state is an integer in ``range(n)``, which lets
+        searches keep their closed lists in arrays indexed by state (see
+        :class:`DenseClosedList`), or ``None`` (the default) when states are
+        arbitrary hashable objects. Problems declaring a size must use
+        ``(from_state, to_state)`` pairs as actions, since the array closed
+        list rebuilds nodes from states alone.
+        """
+        return None
+
+    def closed_list(self, forward=True):
+        """
+        Returns an empty closed list for one direction of a search: a
+        :class:`DenseClosedList` when the problem declares its state space
+        size, otherwise a :class:`ClosedList`.
+
+        :param forward: Whether the list is for the forward direction.
+        :type forward: bool
+        """
+        size = self.state_space_size()
+        if size is None:
+            return ClosedList()
+        return DenseClosedList(size, forward)
+
+
+class AnnotatedProblem(Problem):
+    """
+    A Problem that wraps around another problem and keeps track of the number
+    of core method calls and the time spent in them. Searches that support it
+    (see :func:`near_optimal_front_to_end_bidirectional_search`) also record
+    the pushes and pops of their fringes, the moves from the waiting to the
+    ready queues and the raises of C_lb through :meth:`annotate_fringe`.
+
+    Any other attribute is read from the wrapped problem.
+
+    >>> class Line(Problem):
+    ...     def successors(self, node):
+    ...         yield Node(node.state + 1, node, None, node.cost() + 1)
+    >>> problem = AnnotatedProblem(Line(0, 5))
+    >>> [s.state for s in problem.successors(problem.initial)]
+    [1]
+    >>> problem.goal_test(problem.initial)
+    False
+    >>> stats = problem.stats()
+    >>> stats['successors'], stats['nodes_generated'], stats['goal_test']
+    (1, 1, 1)
+
+    :param problem: The problem to annotate.
+    :type problem: :class:`Problem`
+    """
+
+    COUNTERS = ('successors', 'predecessors', 'nodes_generated', 'goal_test',
+                'node_value', 'pushes', 'pops', 'waiting_to_ready')
+    TIMERS = ('successors', 'predecessors', 'goal_test', 'node_value',
+              'push', 'pop', 'prepare_best')
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.initial = problem.initial
+        self.goal = problem.goal
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        self.times = dict.fromkeys(self.TIMERS, 0.0)
+        self.fringes = []
+
+    def __getattr__(self, name):
+        if name == 'problem':
+            raise AttributeError(name)
+        return getattr(self.problem, name)
+
+    def node_value(self, node):
+        start = perf_counter()
+        value = self.problem.node_value(node)
+        self.times['node_value'] += perf_counter() - start
+        self.counts['node_value'] += 1
+        return value
+
+    def successors(self, node):
+        start = perf_counter()
+        nodes = list(self.problem.successors(node))
+        self.times['successors'] += perf_counter() - start
+        self.counts['successors'] += 1
+        self.counts['nodes_generated'] += len(nodes)
+        return nodes
+
+    def predecessors(self, node):
+        start = perf_counter()
+        nodes = list(self.problem.predecessors(node))
+        self.times['predecessors'] += perf_counter() - start
+        self.counts['predecessors'] += 1
+        self.counts['nodes_generated'] += len(nodes)
+        return nodes
+
+    def random_successor(self, node):
+        self.counts['nodes_generated'] += 1
+        return self.problem.random_successor(node)
+
+    def random_node(self):
+        return self.problem.random_node()
+
+    def state_space_size(self):
+        return self.problem.state_space_size()
+
+    def closed_list(self, forward=True):
+        return self.problem.closed_list(forward)
+
+    def goal_test(self, state_node, goal_node=None):
+        start = perf_counter()
+        met = self.problem.goal_test(state_node, goal_node)
+        self.times['goal_test'] += perf_counter() - start
+        self.counts['goal_test'] += 1
+        return met
+
+    def custom_goal_test(self):
+        """
+        Returns the counting goal_test if the wrapped problem overrides the
+        state equality test of :class:`Problem`, otherwise ``None``.
+        """
+        if type(self.problem).goal_test is Problem.goal_test:
+            return None
+        return self.goal_test
+
+    def annotate_fringe(self, fringe):
+        """
+        Counts and times the pushes, pops and waiting to ready moves of an
+        :class:`NbsDataStructure`, by wrapping the methods of that instance.
+        The time spent in node_value is also part of the push and
+        prepare_best times, since the queues call it.
+        """
+        counts, times = self.counts, self.times
+
+        def timed(method, counter, timer):
+            def wrapper(*args):
+                start = perf_counter()
+                result = method(*args)
+                if timer is not None:
+                    times[timer] += perf_counter() - start
+                if counter is not None:
+                    counts[counter] += 1
+                return result
+            return wrapper
+
+        fringe.push = timed(fringe.push, 'pushes', 'push')
+        fringe.pop = timed(fringe.pop, 'pops', 'pop')
+        fringe.move_from_waiting_to_ready = timed(
+            fringe.move_from_waiting_to_ready, 'waiting_to_ready', None)
+        fringe.prepare_best = timed(fringe.prepare_best, None, 'prepare_best')
+        self.fringes.append(fringe)
+
+    def stats(self):
+        """
+        Returns the counts and the times (in seconds) as one dict, with the
+        times under ``"<name>_seconds"`` keys.
+        """
+        stats = dict(self.counts)
+        stats['c_lb_raises'] = sum(f.c_lb_raises for f in self.fringes)
+        stats['pruned'] = sum(f.pruned for f in self.fringes)
+        for name, seconds in self.times.items():
+            stats[name + '_seconds'] = seconds
+        return stats
+
 
 class Node(object):
     """
@@ -87,13 +259,16 @@ class Node(object):
     :param parent: the node from which the current node was generated
     :type parent: :class:`Node`
     :param action: the action performed to transition from parent to current.
-    :type action: typically a string, but can be any object
+    :type action: typically a string or an edge tuple ``(u, v)``, but can be
+        any object (see :func:`format_action`)
     :param cost: the cost of reaching the current node
     :type cost: float
     :param extra: extra information to store in this node, typically used to
                   store non-hashable information about the state.
     :type extra: object
     """
+    __slots__ = ('state', 'parent', 'action', 'node_cost', 'extra',
+                 'node_depth')
 
     def __init__(self, state, parent=None, action=None, node_cost=0,
                  extra=None):
@@ -155,6 +330,7 @@ class GoalNode(Node):
     """
     Used to represent goals in the backwards portion of the search.
     """
+    __slots__ = ()
 
     def path(self):
         """
@@ -191,6 +367,7 @@ class SolutionNode(object):
     (it just generates them using the user specified successor/predecessor
     functions).
     """
+    __slots__ = ('state_node', 'goal_node')
 
     def __init__(self, state, goal):
         self.state_node = state
@@ -225,6 +402,160 @@ class SolutionNode(object):
         return not self.__eq__(other)
 
 
+class ClosedList(dict):
+    """
+    The closed list of one direction of a search: a dict from every generated
+    state to the cheapest node reaching it.
+
+    >>> closed = ClosedList()
+    >>> closed.add(Node(3, node_cost=2))
+    >>> closed.cost(3), closed.cost(4)
+    (2, inf)
+    """
+
+    def add(self, node):
+        """
+        Records node as the cheapest node reaching its state.
+        """
+        self[node.state] = node
+
+    def cost(self, state):
+        """
+        Returns the cost of the cheapest node reaching state, or ``inf`` if
+        the state was not generated.
+        """
+        node = self.get(state)
+        return float('inf') if node is None else node.cost()
+
+
+class DenseClosedList(object):
+    """
+    A closed list for problems whose states are the integers ``0..size-1``.
+    Instead of keeping the cheapest node of each state alive, it stores its
+    cost, its parent's state and the cost of the step from the parent in
+    arrays preallocated for the whole state space, 24 bytes per state, and
+    rebuilds the node chain from the arrays only when a node is asked for,
+    i.e. when the two directions of a bidirectional search meet. Rebuilt nodes
+    get ``(from_state, to_state)`` actions and no extra. They are kept until
+    the cost of their state changes, so shared ancestors are rebuilt once.
+
+    >>> closed = DenseClosedList(4)
+    >>> root = Node(0)
+    >>> closed.add(root)
+    >>> closed.add(Node(1, root, (0, 1), 1))
+    >>> closed.add(Node(2, Node(1, root, (0, 1), 1), (1, 2), 3))
+    >>> closed.cost(2), 2 in closed, 3 in closed
+    (3.0, True, False)
+    >>> [node.state for node in closed.values()]
+    [0, 1, 2]
+    >>> closed[2].path()
+    ((0, 1), (1, 2))
+
+    :param size: The number of states.
+    :type size: int
+    :param forward: Whether the list belongs to the forward direction (nodes
+        are rebuilt as :class:`Node`) or to the backward one (as
+        :class:`GoalNode`, with the actions reversed).
+    :type forward: bool
+    """
+
+    def __init__(self, size, forward=True):
+        self.costs = array('d', [float('inf')]) * size
+        self.parents = array('q', [-1]) * size
+        self.steps = array('d', [0.0]) * size
+        self.forward = forward
+        # State -> (its cost when the node was built, the node)
+        self.nodes = {}
+        # Generated states in the order they were first added, so that
+        # iterating the list does not scan the whole state space
+        self.states = []
+
+    def add(self, node):
+        """
+        Records node as the cheapest node reaching its state. Its parent must
+        have been recorded before.
+        """
+        state = node.state
+        if self.costs[state] == float('inf'):
+            self.states.append(state)
+        self.costs[state] = node.cost()
+        if node.parent is None:
+            self.parents[state] = -1
+            self.nodes[state] = (node.cost(), node)
+        else:
+            self.parents[state] = node.parent.state
+            self.steps[state] = node.cost() - node.parent.cost()
+
+    def cost(self, state):
+        """
+        Returns the cost of the cheapest node reaching state, or ``inf`` if
+        the state was not generated.
+        """
+        return self.costs[state]
+
+    def get(self, state, default=None):
+        """
+        Returns the cheapest node reaching state, rebuilding it if needed, or
+        default if the state was not generated.
+        """
+        if self.costs[state] == float('inf'):
+            return default
+        # Walk up to the closest ancestor whose node is still valid, then
+        # rebuild the chain below it. Ancestors whose cost dropped since
+        # their child was recorded make the rebuilt node cheaper than the
+        # recorded cost, so node costs always match their path.
+        chain = []
+        entry = self.nodes.get(state)
+        while entry is None or entry[0] != self.costs[state]:
+            chain.append(state)
+            state = self.parents[state]
+            entry = self.nodes.get(state)
+        node = entry[1]
+        node_class = Node if self.forward else GoalNode
+        for state in reversed(chain):
+            if self.forward:
+                action = (node.state, state)
+            else:
+                action = (state, node.state)
+            node = node_class(state, node, action, node.cost() + self.steps[state])
+            self.nodes[state] = (self.costs[state], node)
+        return node
+
+    def values(self):
+        """
+        Yields the cheapest node of every generated state.
+        """
+        for state in self.states:
+            yield self.get(state)
+
+    def __getitem__(self, state):
+        node = self.get(state)
+        if node is None:
+            raise KeyError(state)
+        return node
+
+    def __contains__(self, state):
+        return self.costs[state] != float('inf')
+
+    def __len__(self):
+        return len(self.states)
+
+
+def format_action(action):
+    """
+    Formats an action for display. Actions are stored unformatted on the
+    nodes, so edge tuples only become ``"u -> v"`` strings when shown.
+
+    >>> format_action((3, 4))
+    '3 -> 4'
+    >>> format_action("noop")
+    'noop'
+    """
+    if isinstance(action, tuple) and len(action) == 2:
+        return f"{action[0]} -> {action[1]}"
+    return str(action)
+
+
 class Fringe(object):
     """
     A template for a fringe class. Used to control the strategy of different
@@ -264,6 +595,46 @@ class Fringe(object):
         raise NotImplementedError("No __iter__ method")
 
 
+class _HeapEntry(object):
+    """
+    A single entry of a :class:`PriorityQueue` heap. Entries are ordered so
+    that the entry which should be popped first compares as the smallest one:
+    lower values first, ties broken in favor of the larger node and then of
+    the most recently pushed entry. An entry is never removed from the middle
+    of the heap; instead it is marked as invalid and skipped when it surfaces.
+    """
+    __slots__ = ('value', 'count', 'node', 'valid')
+
+    def __init__(self, value, count, node):
+        self.value = value
+        self.count = count
+        self.node = node
+        self.valid = True
+
+    def __lt__(self, other):
+        if self.value != other.value:
+            return self.value < other.value
+        if other.node < self.node:
+            return True
+        if self.node < other.node:
+            return False
+        return self.count > other.count
+
+
+class _WorstFirst(object):
+    """
+    Reverses the ordering of a :class:`_HeapEntry`, so that a heap of these
+    wrappers yields the worst entry first. Used to enforce max_length.
+    """
+    __slots__ = ('entry',)
+
+    def __init__(self, entry):
+        self.entry = entry
+
+    def __lt__(self, other):
+        return other.entry < self.entry
+
+
 class PriorityQueue(Fringe):
     """
     A priority queue that sorts elements by their value. Always returns the
@@ -273,6 +644,10 @@ class PriorityQueue(Fringe):
     size to exceed the max_length then the worst nodes are removed until the
     list is equal to max_length.
 
+    The queue is backed by a binary heap, so push and pop are O(log n).
+    Removed entries are invalidated lazily and discarded once they reach the
+    top of the heap.
+
     >>> pq = PriorityQueue(node_value=lambda x: x, max_length=3)
     >>> pq.push(6)
     >>> pq.push(0)
@@ -301,6 +676,25 @@ class PriorityQueue(Fringe):
     >>> len(pq)
     0
 
+    When a key function is given every node gets an indexed handle, so the
+    queue holds at most one node per key. Pushing a node with a better value
+    than the queued one replaces it (decrease-key), worse nodes are ignored,
+    and nodes can be removed by key.
+
+    >>> pq = PriorityQueue(node_value=lambda x: x[1], key=lambda x: x[0])
+    >>> pq.push(('a', 5))
+    >>> pq.push(('b', 3))
+    >>> pq.push(('a', 1))
+    >>> pq.push(('b', 4))
+    >>> list(pq)
+    [('a', 1), ('b', 3)]
+    >>> ('b', 0) in pq
+    True
+    >>> pq.remove(('b', 0))
+    True
+    >>> list(pq)
+    [('a', 1)]
+
     :param node_value: The node evaluation function (defaults to
         ``lambda x: x.cost()``)
     :type node_value: a function with one parameter for node
@@ -311,73 +705,173 @@ class PriorityQueue(Fringe):
     :param max_length: The maximum length of the list (defaults to
         ``float('inf')``
     :type max_length: int or ``float('inf')``
+    :param key: A function that returns the handle a node is indexed by
+        (defaults to ``None``, in which case duplicates are allowed and nodes
+        cannot be looked up)
+    :type key: a function with one parameter for node
     """
 
     def __init__(self, node_value=lambda x: x, cost_limit=float('inf'),
-                 max_length=float('inf')):
-        self.nodes = []
+                 max_length=float('inf'), key=None):
         self.max_length = max_length
         self.cost_limit = cost_limit
+        # Whether nodes whose value equals the cost limit are refused as well
+        self.strict_limit = False
         self.node_value = node_value
+        self.key = key
+        # Number of nodes refused or removed because they exceeded the cost limit
+        self.pruned = 0
+        self.clear()
 
     def clear(self):
         """
         Empties the list.
         """
-        self.nodes = []
+        self.heap = []
+        self.worst = []
+        self.index = {}
+        self.length = 0
+        self.counter = 0
+
+    def _prune(self):
+        """
+        Discards invalidated entries from the top of the heap.
+        """
+        heap = self.heap
+        while heap and not heap[0].valid:
+            heappop(heap)
+
+    def _compact(self):
+        """
+        Rebuilds the heaps without their invalidated entries, so that lazy
+        invalidation never lets them grow beyond a constant factor of the
+        number of queued nodes.
+        """
+        self.heap = [e for e in self.heap if e.valid]
+        heapify(self.heap)
+        if self.worst:
+            self.worst = [w for w in self.worst if w.entry.valid]
+            heapify(self.worst)
+
+    def _invalidate(self, entry):
+        entry.valid = False
+        self.length -= 1
+        if self.key is not None:
+            del self.index[self.key(entry.node)]
 
     def peek(self):
         """
         Returns the best node.
         """
-        return self.nodes[-1][1]
+        self._prune()
+        return self.heap[0].node
 
     def peek_value(self):
         """
         Returns the value of the best node.
         """
-        return -self.nodes[-1][0]
+        self._prune()
+        return self.heap[0].value
 
-    def update_cost_limit(self, cost_limit):
+    def update_cost_limit(self, cost_limit, strict=False):
         """
         Updates the cost limit and removes any nodes that violate the new
-        limit.
+        limit. With strict set, nodes whose value equals the limit violate it
+        too.
         """
         self.cost_limit = cost_limit
-        for i in range(len(self.nodes)):
-            if self.nodes[i][0] >= -self.cost_limit:
-                self.nodes = self.nodes[i:]
-                break
+        self.strict_limit = strict
+        for entry in self.heap:
+            if entry.valid and (entry.value > cost_limit or
+                                strict and entry.value == cost_limit):
+                self._invalidate(entry)
+                self.pruned += 1
+        self._compact()
 
     def push(self, node):
         """
         Push a node into the priority queue. If the node exceeds the cost limit
         then it is not added. If the max_length is exceeded by
-        adding the node, then the worst node is discarded from the set.
+        adding the node, then the worst node is discarded from the set. If the
+        queue is keyed and already holds a node with the same key, the better
+        of the two is kept.
         """
         value = self.node_value(node)
 
-        if value > self.cost_limit:
+        if value > self.cost_limit or \
+                self.strict_limit and value == self.cost_limit:
+            self.pruned += 1
             return
 
-        insort(self.nodes, (-value, node))
-
-        if len(self.nodes) > self.max_length:
-            val, node = self.nodes.pop(0)
+        if self.key is not None:
+            k = self.key(node)
+            queued = self.index.get(k)
+            if queued is not None:
+                if queued.value <= value:
+                    return
+                self._invalidate(queued)
+
+        self.counter += 1
+        entry = _HeapEntry(value, self.counter, node)
+        heappush(self.heap, entry)
+        self.length += 1
+        if self.key is not None:
+            self.index[k] = entry
+
+        if self.max_length != float('inf'):
+            heappush(self.worst, _WorstFirst(entry))
+            while self.length > self.max_length:
+                discarded = heappop(self.worst).entry
+                if discarded.valid:
+                    self._invalidate(discarded)
+
+        # Pops never remove entries from the worst heap, so it is bounded the
+        # same way as the heap itself
+        bound = 2 * self.length + 64
+        if len(self.heap) > bound or len(self.worst) > bound:
+            self._compact()
 
     def pop(self):
         """
         Pop the best value from the priority queue.
         """
-        val, node = self.nodes.pop()
-        return node
+        self._prune()
+        entry = heappop(self.heap)
+        self._invalidate(entry)
+        return entry.node
+
+    def find(self, node):
+        """
+        Returns the queued node that has the same key as the given node, or
+        ``None`` if there is no such node. Requires a keyed queue.
+        """
+        entry = self.index.get(self.key(node))
+        if entry is None:
+            return None
+        return entry.node
+
+    def remove(self, node):
+        """
+        Removes the queued node that has the same key as the given node.
+        Returns ``True`` if a node was removed. Requires a keyed queue.
+        """
+        entry = self.index.get(self.key(node))
+        if entry is None:
+            return False
+        self._invalidate(entry)
+        return True
+
+    def __contains__(self, node):
+        if self.key is None:
+            return any(n == node for n in self)
+        return self.key(node) in self.index
 
     def __len__(self):
-        return len(self.nodes)
+        return self.length
 
     def __iter__(self):
-        for v, n in reversed(self.nodes):
-            yield n
+        for entry in sorted(e for e in self.heap if e.valid):
+            yield entry.node
 
     def __str__(self) -> str:
         return str([n for n in self])
@@ -408,28 +902,91 @@ class NbsDataStructure(Fringe):
     0
     >>> len(nbs)
     2
-    >>> nbs.prepare_best(nbs)
+    >>> succeed, messages = nbs.prepare_best(nbs)
+    >>> succeed
     True
+    >>> messages[0]
+    'Action: Raising C-lb to: 2'
+
+    The trace level controls how much of this is reported. With
+    ``trace="summary"`` only C_lb and the queue sizes are reported, and with
+    ``trace="off"`` no messages are built at all.
+
+    >>> nbs.trace = "summary"
+    >>> nbs.prepare_best(nbs)[1][-2]
+    '`  Front Open: 1 waiting, 1 ready'
+    >>> nbs.trace = "off"
+    >>> nbs.prepare_best(nbs)
+    (True, None)
+
+    Once a solution of cost C is known, :meth:`update_cost_limit` drops the
+    nodes that cannot lead to a cheaper one and refuses such nodes from then
+    on.
+
+    >>> nbs.update_cost_limit(4)
+    >>> nbs.push(5)
+    >>> nbs.push(4)
+    >>> len(nbs), nbs.pruned
+    (1, 3)
 
     :param node_value_waiting: The node evaluation function for the waiting
         queue.
     :type node_value_waiting: a function with one parameter for node
     :param node_value_ready: The node evaluation function for the ready queue.
     :type node_value_ready: a function with one parameter for node
+    :param key: A function that returns the handle a node is indexed by in
+        both queues (defaults to the node itself, so :class:`Node` objects are
+        indexed by their state)
+    :type key: a function with one parameter for node
+    :param trace: How much :meth:`prepare_best` reports, one of ``"off"``,
+        ``"summary"`` or ``"full"`` (defaults to ``"full"``)
+    :type trace: str
     """
-    def __init__(self, node_value_waiting, node_value_ready):
+    def __init__(self, node_value_waiting, node_value_ready,
+                 key=lambda x: x, trace=TRACE_FULL):
+        if trace not in TRACE_LEVELS:
+            raise ValueError(f"Unknown trace level: {trace}")
+        self.trace = trace
         self.c_lb = 0
+        self.c_lb_raises = 0
         # Sorted low to high by the f values
-        self.waiting = PriorityQueue(node_value=node_value_waiting)
+        self.waiting = PriorityQueue(node_value=node_value_waiting, key=key)
         # Sorted low to high by the cost values
-        self.ready = PriorityQueue(node_value=node_value_ready)
+        self.ready = PriorityQueue(node_value=node_value_ready, key=key)
 
     def push(self, node):
+        """
+        Adds a node to the waiting queue. If the same state is already queued
+        only the better node is kept, so stale duplicates never accumulate.
+        """
+        queued = self.ready.find(node)
+        if queued is not None:
+            if self.ready.node_value(queued) <= self.ready.node_value(node):
+                return
+            self.ready.remove(queued)
         self.waiting.push(node)
 
     def pop(self):
         return self.ready.pop()
 
+    def update_cost_limit(self, cost_limit):
+        """
+        Removes the nodes of both queues whose value is at least cost_limit
+        and refuses such nodes from then on. With the cost of the best known
+        solution as the limit, the waiting queue keeps the nodes whose f value
+        could still lead to a cheaper solution, and the ready queue those whose
+        cost alone is still below it.
+        """
+        self.waiting.update_cost_limit(cost_limit, strict=True)
+        self.ready.update_cost_limit(cost_limit, strict=True)
+
+    @property
+    def pruned(self):
+        """
+        The number of nodes removed or refused because of the cost limit.
+        """
+        return self.waiting.pruned + self.ready.pruned
+
     def peek(self):
         return self.ready.peek()
 
@@ -453,17 +1010,28 @@ class NbsDataStructure(Fringe):
         self.ready.push(node)
 
     def prepare_best(self, other_fringe):
-        messages = []
+        """
+        Moves nodes from the waiting queues to the ready queues of both
+        fringes, raising the shared C_lb as needed, until the best pair of
+        ready nodes can be expanded. Returns ``(True, messages)`` on success
+        and ``(False, "Failed")`` when no pair can be expanded. The messages
+        depend on the trace level of this fringe, and are ``None`` when
+        tracing is off.
+        """
+        trace = self.trace
+        messages = None if trace == TRACE_OFF else []
         while self.peek_waiting_value() < self.c_lb:
-            messages.append(
-                f"  Entered: {self.peek_waiting()} to the front-ready with value: {self.peek_waiting_value()}"
-            )
+            if trace == TRACE_FULL:
+                messages.append(
+                    f"  Entered: {self.peek_waiting()} to the front-ready with value: {self.peek_waiting_value()}"
+                )
             self.move_from_waiting_to_ready()
 
         while other_fringe.peek_waiting_value() < other_fringe.c_lb:
-            messages.append(
-                f"  Entered: {other_fringe.peek_waiting()} to the back-ready with value: {other_fringe.peek_waiting_value()}"
-            )
+            if trace == TRACE_FULL:
+                messages.append(
+                    f"  Entered: {other_fringe.peek_waiting()} to the back-ready with value: {other_fringe.peek_waiting_value()}"
+                )
             other_fringe.move_from_waiting_to_ready()
 
         while True:
@@ -471,21 +1039,29 @@ class NbsDataStructure(Fringe):
                 return False, "Failed"
 
             if self.peek_ready() + other_fringe.peek_ready() <= self.c_lb:
-                messages.append(f"\n  C-lb: {self.c_lb}")
-                messages.append(f"`  Front Open - Waiting:\n    {self.waiting}")
-                messages.append(f"`  Front Open - Ready:\n    {self.ready}")
-                messages.append(f"`\n  Back Open - Waiting:\n    {other_fringe.waiting}")
-                messages.append(f"`  Back Open - Ready:\n    {other_fringe.ready}\n")
+                if trace == TRACE_FULL:
+                    messages.append(f"\n  C-lb: {self.c_lb}")
+                    messages.append(f"`  Front Open - Waiting:\n    {self.waiting}")
+                    messages.append(f"`  Front Open - Ready:\n    {self.ready}")
+                    messages.append(f"`\n  Back Open - Waiting:\n    {other_fringe.waiting}")
+                    messages.append(f"`  Back Open - Ready:\n    {other_fringe.ready}\n")
+                elif trace == TRACE_SUMMARY:
+                    messages.append(f"\n  C-lb: {self.c_lb}")
+                    messages.append(f"`  Front Open: {len(self.waiting)} waiting, {len(self.ready)} ready")
+                    messages.append(f"`  Back Open: {len(other_fringe.waiting)} waiting, "
+                                    f"{len(other_fringe.ready)} ready\n")
                 return True, messages
 
             moved = False
             if self.peek_waiting_value() <= self.c_lb:
-                messages.append(f"Action: Moving {self.peek_waiting()} from the front waiting to the ready")
+                if trace == TRACE_FULL:
+                    messages.append(f"Action: Moving {self.peek_waiting()} from the front waiting to the ready")
                 self.move_from_waiting_to_ready()
                 moved = True
 
             if other_fringe.peek_waiting_value() <= other_fringe.c_lb:
-                messages.append(f"Action: Moving {other_fringe.peek_waiting()} from the back waiting to the ready")
+                if trace == TRACE_FULL:
+                    messages.append(f"Action: Moving {other_fringe.peek_waiting()} from the back waiting to the ready")
                 other_fringe.move_from_waiting_to_ready()
                 moved = True
 
@@ -493,7 +1069,9 @@ class NbsDataStructure(Fringe):
                 self.c_lb = other_fringe.c_lb = min(self.peek_waiting_value(),
                                                     other_fringe.peek_waiting_value(),
                                                     self.peek_ready() + other_fringe.peek_ready())
-                messages.append(f"Action: Raising C-lb to: {self.c_lb}")
+                self.c_lb_raises += 1
+                if trace != TRACE_OFF:
+                    messages.append(f"Action: Raising C-lb to: {self.c_lb}")
                 if self.c_lb == float("inf"):
                     return False, "Failed"
 
@@ -1,67 +1,197 @@
+from py_search.base import AnnotatedProblem
+from py_search.base import Problem
+from py_search.base import TRACE_FULL
+from py_search.base import TRACE_OFF
 from py_search.base import SolutionNode
 from py_search.base import NbsDataStructure
 
 
-def near_optimal_front_to_end_bidirectional_search(problem):
+def best_meeting(node, opposite_closed, goal_test=None, forward=True):
+    """
+    Returns the cheapest node generated by the opposite direction of a
+    bidirectional search that meets the given node, or ``None`` if there is no
+    such node.
+
+    By default nodes meet when they share a state, so the meeting is found
+    with a single lookup in the opposite state index. When a goal_test is
+    given (e.g., when goals are partial states) the opposite index is scanned
+    instead and a forward node meets a backward node when
+    ``goal_test(forward_node, backward_node)`` is true.
+
+    >>> from py_search.base import Node, GoalNode
+    >>> closed = {3: GoalNode(3, node_cost=2)}
+    >>> best_meeting(Node(3, node_cost=1), closed).cost()
+    2
+    >>> best_meeting(Node(4), closed) is None
+    True
+    >>> best_meeting(Node(4), closed, lambda s, g: s.state > g.state).state
+    3
+
+    :param node: The node that was just generated.
+    :type node: :class:`Node`
+    :param opposite_closed: The state index (state -> best node) of the
+        opposite direction.
+    :type opposite_closed: dict, :class:`ClosedList` or
+        :class:`DenseClosedList`
+    :param goal_test: An optional test for when two nodes meet.
+    :type goal_test: a function with two parameters, the forward node and the
+        backward node
+    :param forward: Whether the node was generated by the forward search.
+    :type forward: bool
+    """
+    if goal_test is None:
+        return opposite_closed.get(node.state)
+
+    best = None
+    for other in opposite_closed.values():
+        if forward:
+            met = goal_test(node, other)
+        else:
+            met = goal_test(other, node)
+        if met and (best is None or other.cost() < best.cost()):
+            best = other
+    return best
+
+
+def near_optimal_front_to_end_bidirectional_search(problem, goal_test=None,
+                                                   trace=TRACE_FULL):
     """
         Performs a near-optimal bidirectional search (NBS) from front to end, using a
         heuristic node value to guide the search. Returns an iterator to the
         solutions, allowing for multiple solutions to be found.
 
+        Each direction keeps a closed index from every generated state to the
+        cheapest node reaching it, so detecting where the two searches meet
+        is a single lookup. The problem chooses the index through
+        :meth:`Problem.closed_list`; problems with dense integer states get
+        arrays instead of dicts (see :class:`DenseClosedList`). Problems whose goal_test is not plain state
+        equality (e.g., goals are partial states) fall back to testing the
+        generated node against the opposite index.
+
+        Besides the expanded nodes and the solution, the iterator yields a
+        list of trace messages before every expansion. The trace level
+        controls what these contain: ``"full"`` dumps the open lists,
+        ``"summary"`` only reports their sizes and C_lb, and ``"off"``
+        builds no messages and yields nothing but nodes and the solution.
+
+        When the problem is an :class:`AnnotatedProblem` the pushes, pops,
+        waiting to ready moves and C_lb raises of both fringes are recorded
+        in it as well, so that ``problem.stats()`` describes the whole search
+        once the solution is yielded.
+
+        Whenever a cheaper solution is found, both fringes drop the nodes
+        whose value is C or more, C being its cost, and refuse such nodes
+        from then on, since they cannot lead to a cheaper solution. The number of pruned
+        nodes is reported in the trace.
+
         :param problem: The problem to solve.
         :type problem: :class:`Problem`
+        :param goal_test: Test for when a forward node meets a backward node
+            (defaults to the problem's goal_test when it is overridden,
+            otherwise to state equality).
+        :type goal_test: a function with two parameters, the forward node and
+            the backward node
+        :param trace: The trace level, one of ``"off"``, ``"summary"`` or
+            ``"full"``.
+        :type trace: str
     """
+    annotated = isinstance(problem, AnnotatedProblem)
+    if goal_test is None:
+        if annotated:
+            goal_test = problem.custom_goal_test()
+        elif type(problem).goal_test is not Problem.goal_test:
+            goal_test = problem.goal_test
+
     c = float("inf")
     current_solution = None
-    ffringe = NbsDataStructure(node_value_waiting=problem.node_value, node_value_ready=lambda n: n.cost())
-    bfringe = NbsDataStructure(node_value_waiting=problem.node_value, node_value_ready=lambda n: n.cost())
-    fclosed = {}
+    ffringe = NbsDataStructure(node_value_waiting=problem.node_value, node_value_ready=lambda n: n.cost(),
+                               trace=trace)
+    bfringe = NbsDataStructure(node_value_waiting=problem.node_value, node_value_ready=lambda n: n.cost(),
+                               trace=trace)
+    if annotated:
+        problem.annotate_fringe(ffringe)
+        problem.annotate_fringe(bfringe)
+    fclosed = problem.closed_list(forward=True)
     ffringe.push(problem.initial)
-    fclosed[problem.initial] = problem.initial.cost()
+    fclosed.add(problem.initial)
 
-    bclosed = {}
+    bclosed = problem.closed_list(forward=False)
 
     bfringe.push(problem.goal)
-    bclosed[problem.goal] = problem.goal.cost()
+    bclosed.add(problem.goal)
+
+    goal = best_meeting(problem.initial, bclosed, goal_test, forward=True)
+    if goal is not None:
+        c = problem.initial.cost() + goal.cost()
+        current_solution = SolutionNode(problem.initial, goal)
+
+    bound = float("inf")
+    notes = []
+
+    def prune():
+        # Nodes whose value is at least the cost of the best known solution cannot lead to a cheaper one
+        pruned = ffringe.pruned + bfringe.pruned
+        ffringe.update_cost_limit(c)
+        bfringe.update_cost_limit(c)
+        pruned = ffringe.pruned + bfringe.pruned - pruned
+        if trace != TRACE_OFF:
+            notes.append(f"Action: Pruning {pruned} nodes with value >= C = {c}")
 
     while len(ffringe) > 0 and len(bfringe) > 0:
         succeed, msg = ffringe.prepare_best(bfringe)
         if not succeed:
-            return
+            break
+        if notes:
+            msg[:0] = notes
+            notes.clear()
 
         u_min = ffringe.peek()
         v_min = bfringe.peek()
 
         if ffringe.c_lb >= c:
-            msg.append(f"\n{u_min} and {v_min} lower bound is {ffringe.c_lb} which is >= than C = {c}")
-            yield msg
+            if trace != TRACE_OFF:
+                msg.append(f"\n{u_min} and {v_min} lower bound is {ffringe.c_lb} which is >= than C = {c}")
+                yield msg
             yield current_solution
 
-        yield msg
+        if trace != TRACE_OFF:
+            yield msg
 
         # Forward Expand
         u_min = ffringe.pop()
         for s in problem.successors(u_min):
-            for goal in bfringe:
-                if problem.goal_test(u_min, goal):
-                    if c > u_min.cost() + goal.cost():
-                        c = u_min.cost() + goal.cost()
-                        current_solution = SolutionNode(u_min, goal)
-            if s not in fclosed or s.cost() < fclosed[s]:
+            goal = best_meeting(s, bclosed, goal_test, forward=True)
+            if goal is not None and c > s.cost() + goal.cost():
+                c = s.cost() + goal.cost()
+                current_solution = SolutionNode(s, goal)
+            if s.cost() < fclosed.cost(s.state):
                 ffringe.push(s)
-                fclosed[s] = s.cost()
+                fclosed.add(s)
+        if c < bound:
+            bound = c
+            prune()
         yield u_min
 
+        # With zero-cost edges the prune above can empty the backward fringe
+        if len(bfringe) == 0:
+            break
+
         # Backward Expand
         v_min = bfringe.pop()
         for p in problem.predecessors(v_min):
-            for state in ffringe:
-                if problem.goal_test(state, v_min):
-                    if c > v_min.cost() + state.cost():
-                        c = v_min.cost() + state.cost()
-                        current_solution = SolutionNode(state, v_min)
-            if p not in bclosed or p.cost() < bclosed[p]:
+            state = best_meeting(p, fclosed, goal_test, forward=False)
+            if state is not None and c > p.cost() + state.cost():
+                c = p.cost() + state.cost()
+                current_solution = SolutionNode(state, p)
+            if p.cost() < bclosed.cost(p.state):
                 bfringe.push(p)
-                bclosed[p] = p.cost()
+                bclosed.add(p)
+        if c < bound:
+            bound = c
+            prune()
 
         yield v_min
+
+    # Pruning (or exhausting the graph) can empty a fringe before C_lb reaches C, and then no cheaper solution exists
+    if current_solution is not None:
+        yield current_solution